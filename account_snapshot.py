@@ -0,0 +1,51 @@
+# account_snapshot.py
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# 帳戶快照：account / positions / clock 三個呼叫並行送出，短 TTL 內所有元件共用同一份
+SNAPSHOT_TTL = 5  # 秒
+
+AccountSnapshot = namedtuple('AccountSnapshot', ['account', 'positions', 'clock', 'fetched_at'])
+
+
+class SnapshotService:
+    """
+    一次畫面重繪只打一輪 (3 個並行) API；同時有多個呼叫者時只有一個真的去抓，其他人等結果。
+    positions 為 tuple，快照本身不可變；有掛單簿時順便把持倉交給它，避免再抓一次。
+    """
+
+    def __init__(self, api, ttl=SNAPSHOT_TTL, book=None):
+        self.api = api
+        self.ttl = ttl
+        self.book = book
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix='account-snapshot')
+        self.fetches = 0
+
+    def _fetch(self):
+        generation = self.book.generation if self.book is not None else None
+        futs = {
+            'account': self._pool.submit(self.api.get_account),
+            'positions': self._pool.submit(self.api.list_positions),
+            'clock': self._pool.submit(self.api.get_clock),
+        }
+        res = {name: fut.result() for name, fut in futs.items()}
+        self.fetches += 1
+        snap = AccountSnapshot(res['account'], tuple(res['positions']), res['clock'], time.time())
+        # 抓取期間有成交 / invalidate 的話，這份持倉可能已過時，不覆蓋掛單簿
+        if self.book is not None: self.book.set_positions(snap.positions, generation)
+        return snap
+
+    def get(self, force=False):
+        with self._lock:
+            snap = self._snapshot
+            if force or snap is None or time.time() - snap.fetched_at >= self.ttl:
+                snap = self._snapshot = self._fetch()
+            return snap
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
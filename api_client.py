@@ -0,0 +1,172 @@
+# api_client.py
+import bisect
+import hashlib
+import random
+import threading
+import time
+import uuid
+import rate_limit
+
+# 會重試的 HTTP 狀態碼：429 (超過頻率) 與 5xx (伺服器暫時錯誤)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5   # 秒
+BACKOFF_CAP = 8.0    # 秒
+
+# 非冪等的端點：伺服器可能已經收單卻回 5xx / 逾時，只有「確定沒送到」才重試
+NON_IDEMPOTENT = {'submit_order', 'replace_order', 'cancel_order', 'cancel_all_orders', 'close_position', 'close_all_positions'}
+
+# 延遲直方圖的桶 (毫秒)，最後一桶為 +inf
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def _status_of(exc):
+    """從 alpaca APIError / requests HTTPError 取出 HTTP 狀態碼"""
+    status = getattr(exc, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    return status
+
+
+def _retry_after(exc):
+    headers = getattr(getattr(exc, 'response', None), 'headers', None) or {}
+    try: return float(headers.get('Retry-After'))
+    except (TypeError, ValueError): return None
+
+
+def _is_transient(exc):
+    status = _status_of(exc)
+    if status is not None: return status in RETRY_STATUS
+    # 沒有狀態碼：連線中斷 / 逾時也值得重試
+    return type(exc).__name__ in ('ConnectionError', 'Timeout', 'ReadTimeout', 'ConnectTimeout')
+
+
+def _never_reached(exc):
+    """請求確定沒被伺服器處理：429 (限流直接拒絕)、連線被拒 / 建立連線逾時"""
+    if _status_of(exc) == 429: return True
+    if type(exc).__name__ == 'ConnectTimeout': return True
+    text = repr(exc)
+    return 'NewConnectionError' in text or 'Connection refused' in text
+
+
+def client_order_id(*parts):
+    """由邏輯訂單的識別資訊算出固定的 client_order_id：重送同一張單會被 Alpaca 當成重複而拒絕，不會成交兩次"""
+    return 'ob-' + hashlib.sha1('|'.join(map(str, parts)).encode('utf-8')).hexdigest()[:40]
+
+
+class EndpointStats:
+    """單一端點的計數與延遲直方圖"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.status = {}
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms):
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q):
+        """由直方圖估算百分位 (回傳該桶上限，毫秒)"""
+        n = sum(self.buckets)
+        if not n: return 0.0
+        target, acc = q * n, 0
+        for i, c in enumerate(self.buckets):
+            acc += c
+            if acc >= target:
+                return float(LATENCY_BUCKETS_MS[i]) if i < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+
+class InstrumentedREST:
+    """
+    包住 tradeapi.REST 的代理物件：每次呼叫都先經過共用的 Token Bucket 限流，
+    遇到 429 / 5xx / 連線錯誤時以「指數退避 + 隨機抖動」重試，並記錄每個端點的呼叫數與延遲直方圖。
+    其餘屬性直接轉給原本的 REST 物件，呼叫端不需要改寫。
+    下單 / 取消等非冪等端點只在「確定沒送到」時重試，submit_order 一律帶 client_order_id。
+    """
+
+    def __init__(self, rest, limiter=None, max_retries=MAX_RETRIES):
+        # 關掉 alpaca_trade_api 自己的 429/504 重試，避免和這裡的重試疊加
+        if hasattr(rest, '_retry'): rest._retry = 0
+        self._rest = rest
+        self._limiter = limiter or rate_limit.alpaca_limiter
+        self._max_retries = max_retries
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        attr = getattr(self._rest, name)
+        if not callable(attr) or name.startswith('_'):
+            return attr
+
+        def call(*args, **kwargs):
+            return self._call(name, attr, args, kwargs)
+        call.__name__ = name
+        return call
+
+    def _stat(self, name):
+        with self._lock:
+            return self._stats.setdefault(name, EndpointStats())
+
+    def _call(self, name, fn, args, kwargs):
+        stat = self._stat(name)
+        if name == 'submit_order' and not kwargs.get('client_order_id'):
+            # 同一次呼叫的每次重送都用同一個 id
+            kwargs = {**kwargs, 'client_order_id': client_order_id(uuid.uuid4().hex)}
+        retryable = _never_reached if name in NON_IDEMPOTENT else _is_transient
+        attempt = 0
+        while True:
+            self._limiter.acquire()
+            t0 = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                ms = (time.perf_counter() - t0) * 1000
+                status = _status_of(e)
+                with self._lock:
+                    stat.calls += 1
+                    stat.observe(ms)
+                    if status is not None: stat.status[status] = stat.status.get(status, 0) + 1
+                    if not retryable(e) or attempt >= self._max_retries:
+                        stat.errors += 1
+                        raise
+                    stat.retries += 1
+                wait = _retry_after(e) or random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+                attempt += 1
+                time.sleep(wait)
+                continue
+            ms = (time.perf_counter() - t0) * 1000
+            with self._lock:
+                stat.calls += 1
+                stat.observe(ms)
+                stat.status[200] = stat.status.get(200, 0) + 1
+            return result
+
+    def metrics(self):
+        """每個端點一列：呼叫數、錯誤、重試、狀態碼分布、平均 / p50 / p95 / 最大延遲 (ms)、直方圖"""
+        with self._lock:
+            rows = []
+            for name, s in sorted(self._stats.items()):
+                rows.append({
+                    'endpoint': name,
+                    'calls': s.calls,
+                    'errors': s.errors,
+                    'retries': s.retries,
+                    'status': dict(s.status),
+                    'avg_ms': round(s.total_ms / s.calls, 1) if s.calls else 0.0,
+                    'p50_ms': s.percentile(0.5),
+                    'p95_ms': s.percentile(0.95),
+                    'max_ms': round(s.max_ms, 1),
+                    'histogram': dict(zip([f'<={b}' for b in LATENCY_BUCKETS_MS] + [f'>{LATENCY_BUCKETS_MS[-1]}'], s.buckets)),
+                })
+            return rows
+
+    def reset_metrics(self):
+        with self._lock:
+            self._stats.clear()
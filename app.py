@@ -2,15 +2,24 @@
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import time
 from i18n import t
 import trading
 import brain
+import backtest
+import optimizer
+import live_feed
+import order_tracker
+import order_store
+import order_book
 import json
 import os
-import yfinance as yf
+import uuid
+import option_cache
+import greeks
 
 st.set_page_config(page_title="AlgoTrading 戰情室", layout="wide", page_icon="📈")
 
@@ -59,6 +68,33 @@ def load_watchlist():
 def save_watchlist(new_list):
     with open(WATCHLIST_FILE, 'w') as f: json.dump(new_list, f)
 
+# ================= 📡 即時串流服務 =================
+@st.cache_resource
+def get_live_hub(source_kind):
+    """整個程式每種來源只開一條串流：各 session 登記自己的清單，串流訂閱聯集，沒人用時自動停掉"""
+    if source_kind == 'replay':
+        make_source = live_feed.ReplaySource
+    else:
+        make_source = lambda: live_feed.AlpacaTradeSource(*trading.get_credentials())
+    load = lambda symbols: trading.get_market_data_many(trading.get_api(), symbols)
+    return live_feed.LiveHub(trading.get_signal, make_source, load)
+
+def _live_session_id():
+    if 'live_id' not in st.session_state: st.session_state.live_id = uuid.uuid4().hex
+    return st.session_state.live_id
+
+def get_live_service(source_kind, symbols):
+    """登記 (或更新) 這個 session 要看的標的；每次重繪 / 即時區塊刷新都呼叫一次，兼當心跳"""
+    prev = st.session_state.get('live_kind')
+    if prev and prev != source_kind: get_live_hub(prev).release(_live_session_id())
+    st.session_state.live_kind = source_kind
+    return get_live_hub(source_kind).acquire(_live_session_id(), symbols)
+
+def stop_live_service():
+    """關掉即時模式：只退訂這個 session 的標的 (最後一個人離開時串流才會真的停)"""
+    kind = st.session_state.pop('live_kind', None)
+    if kind: get_live_hub(kind).release(_live_session_id())
+
 if 'language' not in st.session_state: st.session_state.language = 'zh'
 if 'watchlist' not in st.session_state: st.session_state.watchlist = load_watchlist()
 
@@ -104,21 +140,41 @@ with st.sidebar:
         
         if page_mode == "📈 股票戰情室 (Dashboard)":
             st.markdown("---")
+            scan_ai = st.checkbox("🧠 加入 AI 情緒 (批次分析)", value=False)
             if st.button(t('scan_btn')):
                 res = []
                 api = trading.get_api()
                 status = st.empty()
                 status.text(t('scanning'))
+                # 整份清單一次批次抓 K 線，不再每檔各打一次 API
+                scan_data = trading.get_market_data_many(api, st.session_state.watchlist, days=400)
                 for ticker in st.session_state.watchlist:
-                    d = trading.get_market_data(api, ticker, days=400)
+                    d = scan_data.get(ticker, pd.DataFrame())
                     if not d.empty:
                         last = d.iloc[-1]
                         s20, s200 = last['SMA20'], last['SMA200']
                         sig = "🔵 Cash" if ticker in ['SGOV'] else ("🟢 Bull" if s20 > s200 else ("🔴 Bear" if s20 < s200 else "⚪ Wait"))
                         res.append({"Sym": ticker, "Sig": sig, "Price": f"{last['close']:.1f}"})
+                if scan_ai and res:
+                    # 多檔打包成少數幾個 prompt 並行送出，而不是一檔一個 LLM 請求
+                    status.text(f"🧠 {t('analyzing')}...")
+                    trading.refresh_news(api, [r['Sym'] for r in res])
+                    items = [{'symbol': r['Sym'], 'name': '', 'news': trading.get_stock_news(api, r['Sym']), 'df': scan_data[r['Sym']]} for r in res]
+                    reports = brain.generate_batch_reports(items)
+                    mood_icon = {"success": "🟢", "error": "🔴", "warning": "🟠", "info": "🔵"}
+                    for r in res:
+                        summary, color, kws = reports.get(r['Sym'], ("", "gray", []))
+                        r["AI"] = f"{mood_icon.get(color, '⚪')} {', '.join(kws[:2])}".strip()
                 status.empty()
                 st.dataframe(pd.DataFrame(res), hide_index=True)
     
+        if page_mode == "📈 股票戰情室 (Dashboard)":
+            live_on = st.toggle("📡 即時串流模式 (Live)", value=False)
+            if live_on:
+                live_src = st.radio("資料來源", ["Alpaca 即時", "本機回放 (離線測試)"], horizontal=True)
+                st.session_state.live_source = 'alpaca' if live_src == "Alpaca 即時" else 'replay'
+            st.session_state.live_on = live_on
+    
     # --- 策略參數 ---
     st.markdown("---")
     st.header("⚙️ 策略參數")
@@ -137,31 +193,31 @@ with st.sidebar:
             progress = st.progress(0)
             status_txt = st.empty()
             
-            current_positions = {p.symbol: int(p.qty) for p in api.list_positions()}
+            t0 = time.time()
+            book = trading.get_order_book()
+            current_positions = book.position_qty()
             watchlist = st.session_state.watchlist
-            for i, ticker in enumerate(watchlist):
-                status_txt.text(f"Scanning {ticker}...")
-                progress.progress((i + 1) / len(watchlist))
-                
-                df = trading.get_market_data(api, ticker, days=500)
-                signal, _ = trading.get_signal(df, ticker)
-                
-                action_msg = f"{ticker}: {t('skip_msg')}"
-                if signal == "Buy" and ticker not in current_positions:
-                    res = trading.execute_order(api, ticker, 'buy', qty=1)
-                    action_msg = f"{ticker}: {t('buy_msg')} (1 unit) -> {res}"
-                elif signal == "Sell" and ticker in current_positions:
-                    qty = current_positions[ticker]
-                    res = trading.execute_order(api, ticker, 'sell', qty=qty)
-                    action_msg = f"{ticker}: {t('sell_msg')} ({qty} units) -> {res}"
-                
-                st.session_state.trade_log.append(action_msg)
-                time.sleep(0.5)
+            status_txt.text(t('scanning'))
+            strategy_data = trading.get_market_data_many(api, watchlist, days=500)
+            
+            # 1. 先一次算完所有標的的信號 (純計算)
+            plans = trading.plan_strategy_orders({tk: strategy_data.get(tk, pd.DataFrame()) for tk in watchlist}, current_positions)
+            orders = [p for p in plans if p[1]]
+            log_map = {tk: f"{tk}: {t('skip_msg')}" for tk, side, _ in plans if not side}
             
-            status_txt.text("Done!")
-            time.sleep(1)
-            status_txt.empty()
+            # 2. 掛單只查一次，再並行送單 (Token Bucket 限流，不再每檔固定 sleep)
+            for done, r in enumerate(trading.execute_orders_bulk(api, orders, book=book), start=1):
+                ticker = r['symbol']
+                status_txt.text(f"Ordering {ticker}...")
+                progress.progress(done / len(orders))
+                if r['side'] == 'buy':
+                    log_map[ticker] = f"{ticker}: {t('buy_msg')} ({r['qty']} unit) -> {r['message']}"
+                else:
+                    log_map[ticker] = f"{ticker}: {t('sell_msg')} ({r['qty']} units) -> {r['message']}"
+            
+            st.session_state.trade_log = [log_map[tk] for tk, _, _ in plans]
             progress.empty()
+            status_txt.text(f"Done! ({time.time() - t0:.1f}s)")
 
         if st.session_state.trade_log:
             st.subheader(t('trade_log'))
@@ -170,14 +226,25 @@ with st.sidebar:
         # 持倉顯示 (簡易版)
         st.markdown("---")
         st.subheader(t('positions'))
-        api = trading.get_api()
-        pos = api.list_positions()
+        pos = trading.get_account_snapshot().positions
         if pos:
             p_list = [{"Sym": p.symbol, "P/L": f"{float(p.unrealized_plpc)*100:.1f}%"} for p in pos]
             st.dataframe(pd.DataFrame(p_list), hide_index=True)
         else:
             st.caption(t('no_positions'))
 
+    # --- API 呼叫統計 ---
+    st.markdown("---")
+    with st.expander("📊 API 狀態 (限流 / 重試 / 延遲)"):
+        api_stats = trading.get_api().metrics()
+        if api_stats:
+            st.dataframe(
+                pd.DataFrame(api_stats)[['endpoint', 'calls', 'errors', 'retries', 'p50_ms', 'p95_ms', 'max_ms']],
+                hide_index=True, use_container_width=True
+            )
+        else:
+            st.caption("尚無 API 呼叫")
+
 # ================= 5. 主畫面邏輯 =================
 
 # -----------------------------------------------
@@ -186,20 +253,52 @@ with st.sidebar:
 if page_mode == "📈 股票戰情室 (Dashboard)":
     st.title(t('title'))
     api = trading.get_api()
-    account = api.get_account()
+    # account / positions / clock 一次並行抓齊，整頁共用同一份快照
+    snap = trading.get_account_snapshot()
+    account = snap.account
 
     c1, c2, c3, c4 = st.columns(4)
     c1.metric(t('total_assets'), f"${float(account.equity):,.0f}", f"{float(account.equity) - float(account.last_equity):+.0f}")
     c2.metric(t('cash'), f"${float(account.cash):,.0f}")
     c3.metric(t('buying_power'), f"${float(account.buying_power):,.0f}")
-    c4.metric(t('market_status'), t('open') if api.get_clock().is_open else t('closed'))
+    c4.metric(t('market_status'), t('open') if snap.clock.is_open else t('closed'))
+
+    # --- 📡 即時信號 (串流模式) ---
+    if st.session_state.get('live_on') and st.session_state.watchlist:
+        live_kind, live_syms = st.session_state.get('live_source', 'alpaca'), list(st.session_state.watchlist)
+
+        @st.fragment(run_every="2s")
+        def render_live_signals():
+            st.subheader("📡 即時信號 (Live)")
+            live_svc = get_live_service(live_kind, live_syms)  # 每 2 秒一次，兼當心跳
+            df_live = live_svc.table(live_syms)
+            if df_live.empty:
+                st.caption("等待串流資料中...")
+                return
+            icon = {"success": "🟢", "error": "🔴", "info": "🔵"}
+            df_live['Sig'] = [f"{icon.get(c, '⚪')} {s}" for s, c in zip(df_live['signal'], df_live['color'])]
+            df_live['updated_at'] = df_live['updated_at'].astype(str)
+            st.dataframe(
+                df_live[['Sym', 'Sig', 'close', 'SMA20', 'SMA200', 'RSI', 'updated_at']].round(2),
+                hide_index=True, use_container_width=True
+            )
+            st.caption(f"已處理 {live_svc.events} 筆成交事件")
+
+        render_live_signals()
+    elif st.session_state.get('live_kind'):
+        stop_live_service()  # 關掉即時模式 (或清單清空)：立刻退訂，不等心跳逾時
 
     st.markdown("---")
 
-    all_assets = trading.get_all_assets(api)
-    col_search, _ = st.columns([2, 1])
+    # 搜尋在伺服器端做，只把前幾筆結果送到瀏覽器 (不再把上萬檔塞進 selectbox)
+    asset_idx = trading.get_asset_index(api)
+    col_search, col_pick = st.columns([1, 1])
     with col_search:
-        selected_option = st.selectbox("🔍", [""] + all_assets, index=0, placeholder=t('search_placeholder'), label_visibility="collapsed")
+        query = st.text_input("🔍", placeholder=t('search_placeholder'), label_visibility="collapsed")
+    matches = asset_idx.search(query) if query else []
+    with col_pick:
+        selected_option = st.selectbox("🎯", matches, index=0, label_visibility="collapsed") if matches else None
+    if query and not matches: st.caption("🔍 No match")
 
     if selected_option:
         parts = selected_option.split(' - ')
@@ -258,14 +357,24 @@ if page_mode == "📈 股票戰情室 (Dashboard)":
 
                 st.markdown("---")
                 st.subheader(t('ai_analysis'))
+                # 監控清單 + 目前標的一起批次更新新聞庫，之後各處都讀本機
+                trading.refresh_news(api, list(st.session_state.watchlist) + [target_symbol])
                 news = trading.get_stock_news(api, target_symbol)
-                rpt, col, kws = brain.generate_ai_report(target_symbol, target_name, news, df)
-                
+
                 with st.container():
+                    # 串流：情緒行與摘要邊收邊畫，不必等整段生成完
+                    box = st.empty()
+                    raw = ""
+                    for raw in brain.stream_ai_report(target_symbol, target_name, news, df):
+                        mood, partial, col = brain.parse_partial(raw)
+                        box.info(f"{t('report_title')}\n\n**{mood}**\n\n{partial} ▌")
+                    mood = brain.parse_partial(raw)[0] if "⚠️" not in raw else ""
+                    rpt, col, kws = brain.parse_report(raw)
                     title = t('report_title') if col != "warning" else t('warning_title')
-                    if col == "success": st.success(f"{title}\n\n{rpt}")
-                    elif col == "error": st.error(f"{title}\n\n{rpt}")
-                    else: st.info(f"{title}\n\n{rpt}")
+                    body = f"{title}\n\n**{mood}**\n\n{rpt}" if mood and col != "gray" else f"{title}\n\n{rpt}"
+                    if col == "success": box.success(body)
+                    elif col == "error": box.error(body)
+                    else: box.info(body)
                     
                     st.write(t('gemini_keywords'))
                     tags = "".join([f"<span style='background-color:#eee; padding:4px 8px; margin:2px; border-radius:4px; color:#333'>{k}</span>" for k in kws])
@@ -341,8 +450,8 @@ elif page_mode == "💰 期權策略 (Options)":
             st.divider()
 
             try:
-                tk = yf.Ticker(target)
-                exps = tk.options
+                # 期權鏈走快取 (調整張數等 widget 不會重新下載)
+                exps = option_cache.chain_cache.expirations(target)
                 
                 if exps:
                     # --- 2. 智慧選擇到期日 ---
@@ -368,7 +477,8 @@ elif page_mode == "💰 期權策略 (Options)":
 
                     selected_idx = st.selectbox("到期日", range(len(date_options)), format_func=lambda x: date_options[x], index=best_date_index)
                     selected_date = exps[selected_idx]
-                    opt = tk.option_chain(selected_date)
+                    opt = option_cache.chain_cache.chain(target, selected_date)
+                    option_cache.chain_cache.prefetch_after(target, exps, selected_date)
                     
                     # 根據策略信號自動選擇 Call 或 Put
                     if strategy_type == "CALL":
@@ -384,18 +494,22 @@ elif page_mode == "💰 期權策略 (Options)":
                     if not data.empty:
                         # --- 3. AI 推薦履約價 ---
                         st.markdown("### 🤖 AI 推薦履約價")
+                        # 整條鏈一次算 IV / Greeks，依 |Delta| 目標 (0.7 / 0.5 / 0.3) 挑 ITM / ATM / OTM
+                        is_call = target_direction == "CALL"
+                        data = greeks.analyze_chain(data, last_price, greeks.year_fraction(selected_date), is_call)
+                        picks = greeks.pick_by_delta(data)
                         data['diff'] = abs(data['strike'] - last_price)
-                        atm_row = data.sort_values('diff').iloc[0]
+                        atm_row = picks['ATM'] if picks['ATM'] is not None else data.sort_values('diff').iloc[0]
                         
-                        if target_direction == "CALL":
+                        if is_call:
                             itm_candidates = data[data['strike'] < last_price].sort_values('strike', ascending=False)
                             otm_candidates = data[data['strike'] > last_price].sort_values('strike', ascending=True)
                         else:
                             itm_candidates = data[data['strike'] > last_price].sort_values('strike', ascending=True)
                             otm_candidates = data[data['strike'] < last_price].sort_values('strike', ascending=False)
 
-                        itm_row = itm_candidates.iloc[0] if not itm_candidates.empty else atm_row
-                        otm_row = otm_candidates.iloc[0] if not otm_candidates.empty else atm_row
+                        itm_row = picks['ITM'] if picks['ITM'] is not None else (itm_candidates.iloc[0] if not itm_candidates.empty else atm_row)
+                        otm_row = picks['OTM'] if picks['OTM'] is not None else (otm_candidates.iloc[0] if not otm_candidates.empty else atm_row)
                         
                         c1, c2, c3 = st.columns(3)
                         def show_card(col, title, row, desc, icon):
@@ -403,6 +517,8 @@ elif page_mode == "💰 期權策略 (Options)":
                                 st.info(f"{icon} **{title}**")
                                 st.write(f"Strike: **${row['strike']}**")
                                 st.write(f"Ask: **${row['ask']:.2f}**") # 顯示 Ask 價格比較準確
+                                if pd.notna(row['delta']):
+                                    st.write(f"Δ **{row['delta']:.2f}** | IV **{row['iv']:.0%}** | Θ {row['theta']:.3f}/天")
                                 st.caption(f"{desc}")
                                 st.caption(f"Code: `{row['contractSymbol']}`")
 
@@ -411,6 +527,21 @@ elif page_mode == "💰 期權策略 (Options)":
                         show_card(c3, "積極型 (OTM)", otm_row, "以小博大", "🚀")
                         default_contract = atm_row['contractSymbol']
                         
+                        with st.expander("🔭 全到期日 Delta 掃描"):
+                            target_delta = st.slider("目標 |Delta|", 0.1, 0.9, 0.5, 0.05)
+                            if st.button("掃描所有到期日"):
+                                # 背景一次抓齊各到期日，再整批向量化計算
+                                option_cache.chain_cache.prefetch(target, exps)
+                                chains = {}
+                                for exp in exps:
+                                    try:
+                                        chain = option_cache.chain_cache.chain(target, exp, use_pool=True)
+                                        chains[exp] = chain.calls if is_call else chain.puts
+                                    except Exception: pass
+                                scan = greeks.scan_expirations(chains, last_price, is_call, target_delta)
+                                if scan.empty: st.warning("無資料")
+                                else: st.dataframe(scan.sort_values('theta_pct', ascending=False), hide_index=True)
+
                         # 準備下拉選單資料
                         strike_min = last_price * 0.85
                         strike_max = last_price * 1.15
@@ -509,42 +640,16 @@ elif page_mode == "💰 期權策略 (Options)":
                                 progress.progress(50)
                                 
                                 if use_strategy:
-                                    # 2. 策略模式：等待成交並掛賣單
-                                    status_box.text(f"2/3 訂單已送出，等待成交以執行策略... (ID: {buy_order.id})")
-                                    
-                                    # 簡易輪詢等待成交 (最多等 10 秒，避免卡死)
-                                    filled = False
-                                    real_avg_price = limit_price
-                                    
-                                    for _ in range(10):
-                                        time.sleep(1)
-                                        o = api.get_order(buy_order.id)
-                                        if o.status == 'filled':
-                                            filled = True
-                                            real_avg_price = float(o.filled_avg_price)
-                                            break
-                                    
-                                    if filled:
-                                        progress.progress(80)
-                                        # 3. 掛出翻倍賣單
-                                        sell_qty = int(qty / 2)
-                                        sell_price = round(real_avg_price * 2.0, 2)
-                                        status_box.text(f"3/3 成交價 ${real_avg_price}。掛出保本賣單: {sell_qty}張 @ ${sell_price}...")
-                                        
-                                        api.submit_order(
-                                            symbol=target_contract,
-                                            qty=sell_qty,
-                                            side='sell',
-                                            type='limit',
-                                            limit_price=sell_price,
-                                            time_in_force='gtc' # 永久有效
-                                        )
-                                        progress.progress(100)
-                                        st.balloons()
-                                        st.success(f"✅ 戰術執行成功！\n買入均價: ${real_avg_price}\n已掛賣單: {sell_qty} 張 @ ${sell_price}")
-                                    else:
-                                        progress.progress(100)
-                                        st.warning(f"⚠️ 買單已送出但尚未成交 (狀態: {o.status})。請稍後至「我的資產」手動設定自動停利。")
+                                    # 2. 策略模式：登記「成交後掛翻倍賣單」，由訂單追蹤器在成交事件到達時執行 (不卡住畫面)
+                                    sell_qty = int(qty / 2)
+                                    trading.get_order_tracker().on_fill(
+                                        buy_order.id,
+                                        order_tracker.take_profit_action(api, target_contract, sell_qty, multiple=2.0, ordered_qty=qty),
+                                        label=f"翻倍戰術 {target_contract}"
+                                    )
+                                    progress.progress(100)
+                                    status_box.empty()
+                                    st.success(f"✅ 買單已送出 (ID: {buy_order.id})。成交後會自動依成交均價掛出 {sell_qty} 張翻倍賣單 (GTC)，不論成交要多久。")
                                 else:
                                     # 普通模式
                                     progress.progress(100)
@@ -554,6 +659,11 @@ elif page_mode == "💰 期權策略 (Options)":
                             except Exception as e:
                                 st.error(f"交易失敗: {e}")
 
+                    actions = list(trading.get_order_tracker().actions)
+                    if actions:
+                        with st.expander(f"🛰️ 自動後續動作 ({len(actions)})"):
+                            st.dataframe(pd.DataFrame(actions[::-1]), hide_index=True)
+
                 else:
                     st.warning("Yahoo Finance 暫時無法提供數據。")
             except Exception as e:
@@ -569,7 +679,8 @@ elif page_mode == "💼 我的資產 (Portfolio)":
     
     # 1. 資金看板
     try:
-        account = api.get_account()
+        snap = trading.get_account_snapshot()
+        account = snap.account
         daily_pl = float(account.equity) - float(account.last_equity)
         daily_pl_pct = (daily_pl / float(account.last_equity)) * 100
         
@@ -584,7 +695,8 @@ elif page_mode == "💼 我的資產 (Portfolio)":
 
         # 2. 訂單管理 (這裡很重要，可以看到你的自動單)
         st.subheader("📋 訂單管理 (Orders)")
-        open_orders = api.list_orders(status='open')
+        book = trading.get_order_book()
+        open_orders = book.open_orders()
         with st.expander("⏳ 掛單中 (已預約的自動賣單)", expanded=True):
             if open_orders:
                 o_data = []
@@ -605,6 +717,7 @@ elif page_mode == "💼 我的資產 (Portfolio)":
                 
                 if st.button("❌ 取消所有掛單 (重設策略)"):
                     api.cancel_all_orders()
+                    book.invalidate()
                     st.success("已取消所有掛單！")
                     time.sleep(1)
                     st.rerun()
@@ -614,7 +727,7 @@ elif page_mode == "💼 我的資產 (Portfolio)":
         # 3. 持倉列表 (終極版：分流 + 總成本 + 到期日解析)
         st.divider()
         st.subheader("📊 目前持倉 (Current Positions)")
-        positions = api.list_positions()
+        positions = snap.positions
         
         if positions:
             # 準備容器
@@ -757,14 +870,14 @@ elif page_mode == "💼 我的資產 (Portfolio)":
                 with st.spinner("設定中..."):
                     try:
                         # 這種單子會一直掛在 Alpaca 伺服器上，直到成交或你取消，不用開電腦
-                        api.submit_order(
+                        book.record(api.submit_order(
                             symbol=target_symbol,
                             qty=qty_to_sell,
                             side='sell',
                             type='limit',
                             limit_price=target_price,
                             time_in_force='day'
-                        )
+                        ))
                         st.success(f"✅ 設定成功！已掛出賣單 @ ${target_price:.2f}。")
                         st.balloons()
                         time.sleep(2)
@@ -789,49 +902,65 @@ elif page_mode == "📝 交易紀錄 (Log)":
     api = trading.get_api()
     
     # 過濾器
-    col1, col2 = st.columns([3, 1])
+    col1, col2, col3 = st.columns([3, 1, 1])
     with col1:
         log_filter = st.radio("顯示類別", ["全部 (All)", "已成交 (Filled)", "掛單中 (Open)"], horizontal=True)
     with col2:
+        sym_filter = st.text_input("代碼", placeholder="全部").strip().upper()
+    with col3:
         if st.button("🔄 刷新紀錄"):
+            trading.sync_order_history(api, force=True)
             st.rerun()
             
-    status_map = {"全部 (All)": "all", "已成交 (Filled)": "closed", "掛單中 (Open)": "open"}
+    status_map = {"全部 (All)": "all", "已成交 (Filled)": "filled", "掛單中 (Open)": "open"}
     target_status = status_map[log_filter]
     
-    # 獲取資料
+    # 獲取資料 (本機訂單資料庫，只同步新單；篩選與分頁都是索引查詢)
     with st.spinner("載入訂單資料中..."):
-        df_orders = trading.get_orders_history(api, status=target_status)
+        _, total = trading.get_orders_history(api, status=target_status, symbol=sym_filter or None, page_size=1)
+    c_size, c_page = st.columns([1, 3])
+    with c_size:
+        page_size = st.selectbox("每頁筆數", [50, 200, 500], index=1)
+    n_pages = max(1, -(-total // page_size))
+    with c_page:
+        page = st.number_input(f"頁數 (共 {n_pages} 頁 / {total} 筆)", min_value=1, max_value=n_pages, value=1) - 1
+    df_orders, _ = trading.get_orders_history(api, status=target_status, symbol=sym_filter or None, page=page, page_size=page_size)
+    
+    with st.expander("📊 依代碼彙總"):
+        agg = order_store.summary(target_status, symbol=sym_filter or None)
+        st.dataframe(agg.rename(columns={'symbol': '代碼', 'orders': '訂單數', 'filled': '成交數', 'buy_value': '買進金額', 'sell_value': '賣出金額'}),
+                     hide_index=True, use_container_width=True)
+    
+    # 上一輪批次取消的結果 (取消完只重繪一次)
+    if st.session_state.get('cancel_results'):
+        res = pd.DataFrame(st.session_state.pop('cancel_results'))
+        ok = int((res['status'] == 'requested').sum())
+        (st.success if ok == len(res) else st.warning)(f"已送出取消要求 {ok} / {len(res)} 筆 (最終狀態以同步結果為準)")
+        if ok < len(res): st.dataframe(res[res['status'] != 'requested'], hide_index=True, use_container_width=True)
     
     if not df_orders.empty:
-        # 針對掛單中 (Open) 的訂單提供「取消」功能
-        if target_status == 'open' or log_filter == "全部 (All)":
-            st.info("💡 提示：勾選左側框框可選取，下方按鈕可取消掛單。")
-            
-            # 使用 DataEditor 讓使用者可以勾選 (Streamlit 新功能)
-            # 這裡簡單一點，直接顯示表格，後面加按鈕
-            
-            for index, row in df_orders.iterrows():
-                # 只對 Open 狀態顯示取消按鈕
-                if row['狀態'] in ['new', 'accepted', 'partially_filled', 'held']:
-                    c1, c2 = st.columns([5, 1])
-                    with c1:
-                        st.text(f"{row['時間 (提交)']} | {row['代碼']} | {row['方向']} {row['數量']} @ {row['類型']}")
-                    with c2:
-                        if st.button("❌ 取消", key=f"cancel_{row['ID']}"):
-                            if trading.cancel_order(api, row['ID']):
-                                st.success("已取消")
-                                time.sleep(0.5)
-                                st.rerun()
-                            else:
-                                st.error("取消失敗")
-                    st.divider()
-                else:
-                    # 已成交或已取消的，顯示簡單列表
-                    st.caption(f"{row['時間 (提交)']} | {row['代碼']} | {row['方向']} {row['數量']} | 均價: ${row['成交均價']} | {row['狀態']}")
+        # 單一表格 (虛擬捲動) 取代一列一個 widget；掛單可勾選後一次批次取消
+        cancelable = df_orders['狀態'].isin(list(order_book.OPEN_STATUSES))
+        if cancelable.any():
+            st.info("💡 提示：勾選「取消」欄位，再按下方按鈕一次取消所有選取的掛單。")
+            select_all = st.checkbox(f"全選本頁掛單 ({int(cancelable.sum())} 筆)")
+            grid = df_orders.copy()
+            grid.insert(0, "取消", cancelable & select_all)
+            edited = st.data_editor(
+                grid, hide_index=True, use_container_width=True, height=600,
+                disabled=[c for c in grid.columns if c != "取消"],
+                column_config={"取消": st.column_config.CheckboxColumn("取消", help="只有掛單中的訂單可以取消")},
+                key=f"orders_grid_{target_status}_{sym_filter}_{page}_{page_size}_{select_all}"
+            )
+            selected = edited.loc[edited["取消"] & cancelable, "ID"].tolist()
+            if st.button(f"❌ 取消選取的掛單 ({len(selected)})", type="primary", disabled=not selected):
+                with st.spinner(f"並行取消 {len(selected)} 筆..."):
+                    st.session_state.cancel_results = list(trading.cancel_orders_bulk(api, selected))
+                trading.get_order_book().invalidate()
+                st.rerun()
         else:
             # 純顯示表格
-            st.dataframe(df_orders, use_container_width=True, hide_index=True)
+            st.dataframe(df_orders, use_container_width=True, hide_index=True, height=600)
     else:
         st.info("📭 目前沒有相關的訂單紀錄。")
 
@@ -850,163 +979,256 @@ elif page_mode == "🧪 回測實驗室 (Backtest)":
 
     # --- 1. 回測參數設定 ---
     st.sidebar.header("⚙️ 回測參數")
+    bt_mode = st.radio("回測模式", ["🎯 單次回測", "🧬 參數最佳化 (Optimizer)", "📦 投資組合 (Portfolio)"], horizontal=True)
     my_backtest_list = st.session_state.watchlist if st.session_state.watchlist else ["NVDA", "TSLA", "PLTR", "AMD", "AAPL", "SPY", "QQQ"]
     # 標的與時間
     bc1, bc2 = st.columns(2)
     with bc1:
-        backtest_symbol = st.selectbox("回測標的 (從監控清單)", my_backtest_list, index=0)
+        if bt_mode == "📦 投資組合 (Portfolio)":
+            st.caption(f"回測標的：整份監控清單 ({len(my_backtest_list)} 檔)")
+            st.caption(", ".join(my_backtest_list))
+        else:
+            backtest_symbol = st.selectbox("回測標的 (從監控清單)", my_backtest_list, index=0)
     with bc2:
         initial_capital = st.number_input("初始資金 ($)", value=10000, step=1000)
 
-    # 策略參數
-    c1, c2, c3, c4 = st.columns(4)
-    with c1:
-        sma_short = st.number_input("短期均線 (進場)", value=20, min_value=5)
-    with c2:
-        sma_long = st.number_input("長期均線 (出場)", value=50, min_value=10)
-    with c3:
-        rsi_buy_max = st.number_input("RSI 上限 (買入濾網)", value=70, help="RSI 高於此值不買 (避免追高)")
-    with c4:
-        stop_loss_pct = st.number_input("停損 (%)", value=10.0, step=1.0) / 100
-
     days_back = st.slider("回測天數 (Days Lookback)", 100, 1000, 365)
 
-    # --- 2. 執行回測 ---
-    if st.button("🚀 開始回測 (Run Backtest)", type="primary"):
-        status_text = st.empty()
-        status_text.text("正在下載歷史數據...")
+    if bt_mode == "🎯 單次回測":
+        # 策略參數
+        c1, c2, c3, c4 = st.columns(4)
+        with c1:
+            sma_short = st.number_input("短期均線 (進場)", value=20, min_value=5)
+        with c2:
+            sma_long = st.number_input("長期均線 (出場)", value=50, min_value=10)
+        with c3:
+            rsi_buy_max = st.number_input("RSI 上限 (買入濾網)", value=70, help="RSI 高於此值不買 (避免追高)")
+        with c4:
+            stop_loss_pct = st.number_input("停損 (%)", value=10.0, step=1.0) / 100
+
+        # --- 2. 執行回測 ---
+        if st.button("🚀 開始回測 (Run Backtest)", type="primary"):
+            status_text = st.empty()
+            status_text.text("正在下載歷史數據...")
         
-        try:
-            # 下載數據
-            df = trading.get_market_data(trading.get_api(), backtest_symbol, days=days_back+50) # 多抓一點算SMA
+            try:
+                # 下載數據
+                df = trading.get_market_data(trading.get_api(), backtest_symbol, days=days_back+50) # 多抓一點算SMA
             
-            if df.empty:
-                st.error("❌ 無法獲取數據，請檢查標的或網絡。")
-            else:
-                status_text.text("計算技術指標...")
-                
-                # 計算策略指標
-                df['SMA_S'] = df['close'].rolling(window=sma_short).mean()
-                df['SMA_L'] = df['close'].rolling(window=sma_long).mean()
-                # RSI 已經在 get_market_data 裡算好了，直接用 df['RSI']
-                
-                # 初始化回測變數
-                cash = initial_capital
-                position = 0 # 持股數量
-                equity_curve = []
-                trade_log = []
-                entry_price = 0
-                
-                # 開始逐日模擬 (從資料足夠那天開始)
-                start_idx = max(sma_long, 50) 
-                
-                status_text.text("正在逐日模擬交易...")
+                if df.empty:
+                    st.error("❌ 無法獲取數據，請檢查標的或網絡。")
+                else:
+                    status_text.text("向量化回測中...")
                 
-                for i in range(start_idx, len(df)):
-                    today = df.iloc[i]
-                    prev = df.iloc[i-1]
-                    date = df.index[i].strftime('%Y-%m-%d')
-                    price = today['close']
-                    
-                    action = "HOLD"
-                    
-                    # --- 賣出邏輯 (Sell Logic) ---
-                    if position > 0:
-                        # 1. 跌破長期均線 -> 趨勢反轉，賣出
-                        if price < today['SMA_L']:
-                            reason = f"跌破 SMA{sma_long}"
-                            action = "SELL"
-                        # 2. 停損 (Stop Loss)
-                        elif price < entry_price * (1 - stop_loss_pct):
-                            reason = f"觸發停損 (-{stop_loss_pct*100}%)"
-                            action = "SELL"
-                        
-                        if action == "SELL":
-                            cash += position * price
-                            profit = (price - entry_price) * position
-                            profit_pct = (price / entry_price) - 1
-                            trade_log.append({
-                                "日期": date, "動作": "🔴 賣出", "價格": price, 
-                                "數量": position, "損益": profit, "報酬率": f"{profit_pct*100:.1f}%", "原因": reason
-                            })
-                            position = 0
-                            entry_price = 0
-
-                    # --- 買入邏輯 (Buy Logic) ---
-                    elif position == 0:
-                        # 策略：收盤價站上 短期均線 且 RSI 沒有過熱
-                        if price > today['SMA_S'] and today['RSI'] < rsi_buy_max:
-                            # 全倉買入 (模擬)
-                            position = int(cash / price)
-                            if position > 0:
-                                cost = position * price
-                                cash -= cost
-                                entry_price = price
-                                trade_log.append({
-                                    "日期": date, "動作": "🔵 買入", "價格": price, 
-                                    "數量": position, "損益": 0, "報酬率": "-", "原因": f"站上 SMA{sma_short}"
-                                })
-
-                    # 紀錄當日總資產
-                    total_value = cash + (position * price)
-                    equity_curve.append({"Date": df.index[i], "Equity": total_value})
-
-                status_text.empty()
+                    # 計算策略指標 + 模擬交易 (backtest 模組以 NumPy 陣列一次算完，不再逐日 iloc)
+                    # RSI 已經在 get_market_data 裡算好了，直接用 df['RSI']
+                    result = backtest.run_backtest(
+                        df, sma_short=sma_short, sma_long=sma_long, rsi_buy_max=rsi_buy_max,
+                        stop_loss_pct=stop_loss_pct, initial_capital=initial_capital, symbol=backtest_symbol
+                    )
+                    start_idx = result['start_idx']
+                    trade_log = result['trade_log']
+                    df_eq = result['equity'].to_frame()
+
+                    status_text.empty()
                 
-                # --- 3. 顯示結果報告 ---
-                if not equity_curve:
-                    st.warning("在此期間內沒有觸發任何交易。")
-                else:
-                    df_eq = pd.DataFrame(equity_curve).set_index("Date")
-                    final_value = df_eq.iloc[-1]['Equity']
-                    total_return = (final_value - initial_capital) / initial_capital
+                    # --- 3. 顯示結果報告 ---
+                    if df_eq.empty:
+                        st.warning("在此期間內沒有觸發任何交易。")
+                    else:
+                        stats = result['stats']
+                        final_value = stats['final_value']
+                        total_return = stats['total_return']
                     
-                    # 計算買入持有 (Buy & Hold) 的績效作為對比
-                    start_price = df.iloc[start_idx]['close']
-                    end_price = df.iloc[-1]['close']
-                    bh_return = (end_price - start_price) / start_price
+                        # 計算買入持有 (Buy & Hold) 的績效作為對比
+                        bh_return = stats['bh_return']
                     
-                    # 顯示 KPI
-                    st.subheader("📊 回測績效報告")
-                    k1, k2, k3, k4 = st.columns(4)
-                    k1.metric("最終資產", f"${final_value:,.0f}")
-                    k2.metric("策略報酬率", f"{total_return*100:.1f}%", 
-                              delta=f"{(total_return - bh_return)*100:.1f}% vs Buy&Hold",
-                              help="綠色代表戰勝大盤(買入持有)，紅色代表輸給大盤")
-                    k3.metric("交易次數", f"{len([t for t in trade_log if t['動作']=='🔴 賣出'])}")
+                        # 顯示 KPI
+                        st.subheader("📊 回測績效報告")
+                        k1, k2, k3, k4 = st.columns(4)
+                        k1.metric("最終資產", f"${final_value:,.0f}")
+                        k2.metric("策略報酬率", f"{total_return*100:.1f}%", 
+                                  delta=f"{(total_return - bh_return)*100:.1f}% vs Buy&Hold",
+                                  help="綠色代表戰勝大盤(買入持有)，紅色代表輸給大盤")
+                        k3.metric("交易次數", f"{stats['num_trades']}")
+                        k4.metric("勝率 (Win Rate)", f"{stats['win_rate']*100:.0f}%")
+
+                        # 繪製權益曲線
+                        st.subheader("📈 資產成長曲線 (Equity Curve)")
                     
-                    # 勝率計算
-                    wins = [t for t in trade_log if t['動作']=='🔴 賣出' and t['損益'] > 0]
-                    total_trades = len([t for t in trade_log if t['動作']=='🔴 賣出'])
-                    win_rate = len(wins) / total_trades if total_trades > 0 else 0
-                    k4.metric("勝率 (Win Rate)", f"{win_rate*100:.0f}%")
-
-                    # 繪製權益曲線
-                    st.subheader("📈 資產成長曲線 (Equity Curve)")
+                        fig = make_subplots(specs=[[{"secondary_y": True}]])
                     
-                    fig = make_subplots(specs=[[{"secondary_y": True}]])
+                        # 策略曲線
+                        fig.add_trace(go.Scatter(
+                            x=df_eq.index, y=df_eq['Equity'], 
+                            name="策略回報 (Strategy)", line=dict(color='green', width=2)
+                        ), secondary_y=False)
                     
-                    # 策略曲線
-                    fig.add_trace(go.Scatter(
-                        x=df_eq.index, y=df_eq['Equity'], 
-                        name="策略回報 (Strategy)", line=dict(color='green', width=2)
-                    ), secondary_y=False)
+                        # 股價曲線 (對照用)
+                        df_bench = df.iloc[start_idx:].copy()
+                        fig.add_trace(go.Scatter(
+                            x=df_bench.index, y=df_bench['close'], 
+                            name=f"{backtest_symbol} 股價", line=dict(color='gray', dash='dot')
+                        ), secondary_y=True)
                     
-                    # 股價曲線 (對照用)
-                    df_bench = df.iloc[start_idx:].copy()
-                    fig.add_trace(go.Scatter(
-                        x=df_bench.index, y=df_bench['close'], 
-                        name=f"{backtest_symbol} 股價", line=dict(color='gray', dash='dot')
-                    ), secondary_y=True)
+                        fig.update_layout(title="你的策略 vs 股價走勢", hovermode="x unified")
+                        fig.update_yaxes(title_text="總資產 ($)", secondary_y=False)
+                        fig.update_yaxes(title_text="股價 ($)", secondary_y=True)
+                        st.plotly_chart(fig, use_container_width=True)
                     
-                    fig.update_layout(title="你的策略 vs 股價走勢", hovermode="x unified")
-                    fig.update_yaxes(title_text="總資產 ($)", secondary_y=False)
-                    fig.update_yaxes(title_text="股價 ($)", secondary_y=True)
+                        # 交易明細
+                        with st.expander("📝 查看詳細交易紀錄 (Trade Log)"):
+                            st.dataframe(pd.DataFrame(trade_log))
+
+            except Exception as e:
+                st.error(f"回測發生錯誤: {e}")
+
+    # ----------------------------------------------------
+    # 🧬 參數最佳化：網格 / 隨機搜尋，多核心平行回測
+    # ----------------------------------------------------
+    elif bt_mode == "🧬 參數最佳化 (Optimizer)":
+        st.caption("一次跑上千組 SMA / RSI / 停損參數 (多核心平行運算)，找出最適合 get_signal 的設定。")
+
+        search_type = st.radio("搜尋方式", ["網格搜尋 (Grid)", "隨機搜尋 (Random)"], horizontal=True)
+        o1, o2 = st.columns(2)
+        with o1:
+            sma_short_rng = st.slider("短期均線範圍", 5, 100, (5, 50))
+            rsi_rng = st.slider("RSI 上限範圍", 30, 100, (50, 80))
+        with o2:
+            sma_long_rng = st.slider("長期均線範圍", 10, 250, (20, 200))
+            stop_rng = st.slider("停損範圍 (%)", 1.0, 30.0, (3.0, 15.0), step=1.0)
+
+        if search_type == "網格搜尋 (Grid)":
+            g1, g2, g3, g4 = st.columns(4)
+            with g1: sma_short_step = st.number_input("短均線間距", value=5, min_value=1)
+            with g2: sma_long_step = st.number_input("長均線間距", value=10, min_value=1)
+            with g3: rsi_step = st.number_input("RSI 間距", value=5, min_value=1)
+            with g4: stop_step = st.number_input("停損間距 (%)", value=2.0, min_value=0.5, step=0.5)
+            params = optimizer.grid_params(
+                range(sma_short_rng[0], sma_short_rng[1] + 1, sma_short_step),
+                range(sma_long_rng[0], sma_long_rng[1] + 1, sma_long_step),
+                range(rsi_rng[0], rsi_rng[1] + 1, rsi_step),
+                [x / 100 for x in np.arange(stop_rng[0], stop_rng[1] + 1e-9, stop_step)]
+            )
+        else:
+            n_samples = st.number_input("抽樣組數", value=2000, min_value=10, step=500)
+            params = optimizer.random_params(
+                n_samples, sma_short_rng, sma_long_rng, rsi_rng, (stop_rng[0] / 100, stop_rng[1] / 100)
+            )
+        st.caption(f"共 {len(params)} 組參數")
+
+        if st.button("🧬 開始最佳化 (Run Optimizer)", type="primary"):
+            try:
+                with st.spinner(f"平行回測 {len(params)} 組參數中..."):
+                    df = trading.get_market_data(trading.get_api(), backtest_symbol, days=days_back+50)
+                    t0 = time.time()
+                    df_opt = optimizer.run_sweep(df, params, initial_capital=initial_capital)
+                    elapsed = time.time() - t0
+
+                if df_opt.empty:
+                    st.error("❌ 無法獲取數據，請檢查標的或網絡。")
+                else:
+                    st.success(f"✅ 完成 {len(df_opt)} 組回測，耗時 {elapsed:.2f} 秒")
+                    best = df_opt.iloc[0]
+                    k1, k2, k3, k4 = st.columns(4)
+                    k1.metric("最佳報酬率", f"{best['total_return']*100:.1f}%")
+                    k2.metric("最大回撤", f"{best['max_drawdown']*100:.1f}%")
+                    k3.metric("最佳均線", f"SMA{int(best['sma_short'])} / SMA{int(best['sma_long'])}")
+                    k4.metric("RSI / 停損", f"{best['rsi_buy_max']:.0f} / {best['stop_loss_pct']*100:.1f}%")
+
+                    # 報酬率 vs 最大回撤 熱度圖 (每一格 = 落在該區間的參數組數)
+                    st.subheader("🔥 報酬率 vs 最大回撤 (Heatmap)")
+                    fig = go.Figure(go.Histogram2d(
+                        x=df_opt['max_drawdown'] * 100, y=df_opt['total_return'] * 100,
+                        nbinsx=30, nbinsy=30, colorscale='Viridis', colorbar=dict(title="組數")
+                    ))
+                    fig.update_layout(xaxis_title="最大回撤 (%)", yaxis_title="策略報酬率 (%)", height=450)
                     st.plotly_chart(fig, use_container_width=True)
-                    
-                    # 交易明細
-                    with st.expander("📝 查看詳細交易紀錄 (Trade Log)"):
-                        st.dataframe(pd.DataFrame(trade_log))
 
-        except Exception as e:
-            st.error(f"回測發生錯誤: {e}")
\ No newline at end of file
+                    # 參數排行榜
+                    st.subheader("🏆 參數排行榜")
+                    df_show = df_opt.head(100).copy()
+                    df_show['total_return'] = (df_show['total_return'] * 100).round(1)
+                    df_show['max_drawdown'] = (df_show['max_drawdown'] * 100).round(1)
+                    df_show['win_rate'] = (df_show['win_rate'] * 100).round(0)
+                    df_show['stop_loss_pct'] = (df_show['stop_loss_pct'] * 100).round(1)
+                    st.dataframe(df_show.rename(columns={
+                        'sma_short': '短均線', 'sma_long': '長均線', 'rsi_buy_max': 'RSI 上限', 'stop_loss_pct': '停損 (%)',
+                        'total_return': '報酬率 (%)', 'max_drawdown': '最大回撤 (%)', 'num_trades': '交易次數',
+                        'win_rate': '勝率 (%)', 'final_value': '最終資產'
+                    }), use_container_width=True, hide_index=True)
+            except Exception as e:
+                st.error(f"最佳化發生錯誤: {e}")
+
+    # ----------------------------------------------------
+    # 📦 投資組合：整份監控清單共用一個資金池
+    # ----------------------------------------------------
+    elif bt_mode == "📦 投資組合 (Portfolio)":
+        st.caption("同時回測監控清單內所有標的，共用現金池，並列出各標的損益貢獻。")
+
+        c1, c2, c3, c4 = st.columns(4)
+        with c1:
+            sma_short = st.number_input("短期均線 (進場)", value=20, min_value=5)
+        with c2:
+            sma_long = st.number_input("長期均線 (出場)", value=50, min_value=10)
+        with c3:
+            rsi_buy_max = st.number_input("RSI 上限 (買入濾網)", value=70, help="RSI 高於此值不買 (避免追高)")
+        with c4:
+            stop_loss_pct = st.number_input("停損 (%)", value=10.0, step=1.0) / 100
+
+        sizing_map = {
+            "平均分配 (總資產 / 標的數)": backtest.SIZING_EQUAL,
+            "固定比例 (總資產 %)": backtest.SIZING_PERCENT,
+            "固定金額 ($)": backtest.SIZING_FIXED,
+        }
+        s1, s2 = st.columns(2)
+        with s1:
+            sizing_label = st.selectbox("部位大小 (Sizing)", list(sizing_map.keys()))
+        with s2:
+            position_pct, position_amount = 0.2, 2000
+            if sizing_map[sizing_label] == backtest.SIZING_PERCENT:
+                position_pct = st.number_input("每檔比例 (%)", value=20.0, min_value=1.0, max_value=100.0, step=5.0) / 100
+            elif sizing_map[sizing_label] == backtest.SIZING_FIXED:
+                position_amount = st.number_input("每檔金額 ($)", value=2000, min_value=100, step=500)
+
+        if st.button("📦 開始組合回測 (Run Portfolio)", type="primary"):
+            try:
+                with st.spinner(f"批次下載 {len(my_backtest_list)} 檔標的數據..."):
+                    data = trading.get_market_data_many(trading.get_api(), my_backtest_list, days=days_back+50)
+                missing = [sym for sym, d in data.items() if d.empty]
+                if missing: st.warning(f"⚠️ 無法獲取數據：{', '.join(missing)}")
+
+                result = backtest.run_portfolio_backtest(
+                    data, sma_short=sma_short, sma_long=sma_long, rsi_buy_max=rsi_buy_max,
+                    stop_loss_pct=stop_loss_pct, initial_capital=initial_capital,
+                    sizing=sizing_map[sizing_label], position_pct=position_pct, position_amount=position_amount
+                )
+                df_eq = result['equity']
+                if df_eq.empty:
+                    st.error("❌ 無法獲取數據，請檢查標的或網絡。")
+                else:
+                    stats = result['stats']
+                    st.subheader("📊 組合績效報告")
+                    k1, k2, k3, k4 = st.columns(4)
+                    k1.metric("最終資產", f"${stats['final_value']:,.0f}")
+                    k2.metric("組合報酬率", f"{stats['total_return']*100:.1f}%")
+                    k3.metric("最大回撤", f"{stats['max_drawdown']*100:.1f}%")
+                    k4.metric("交易次數 / 勝率", f"{stats['num_trades']} / {stats['win_rate']*100:.0f}%")
+
+                    st.subheader("📈 組合資產曲線 (Equity Curve)")
+                    fig = go.Figure(go.Scatter(x=df_eq.index, y=df_eq.values, name="組合總資產", line=dict(color='green', width=2)))
+                    fig.update_layout(hovermode="x unified", yaxis_title="總資產 ($)")
+                    st.plotly_chart(fig, use_container_width=True)
+
+                    st.subheader("🧩 各標的損益貢獻 (Attribution)")
+                    st.dataframe(
+                        result['attribution'].style.format({
+                            "已實現損益": "${:+,.2f}", "未實現損益": "${:+,.2f}", "總損益": "${:+,.2f}", "勝率": "{:.0%}"
+                        }),
+                        use_container_width=True, hide_index=True
+                    )
+
+                    with st.expander("📝 查看詳細交易紀錄 (Trade Log)"):
+                        st.dataframe(pd.DataFrame(result['trade_log']))
+            except Exception as e:
+                st.error(f"組合回測發生錯誤: {e}")
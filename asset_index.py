@@ -0,0 +1,111 @@
+# asset_index.py
+import difflib
+import os
+import re
+from datetime import datetime, timezone
+import numpy as np
+
+# 股票代碼 / 名稱搜尋索引：資料存成 NumPy 字串陣列 (依代碼排序)，每天更新一次本機快取
+CACHE_FILE = os.environ.get('ASSET_CACHE_FILE', 'assets_cache.npz')
+TOP_K = 10
+
+
+def _today():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+
+class AssetIndex:
+    """
+    代碼前綴用二分搜尋 (searchsorted)，名稱以「字首」索引 (單字排序陣列 + 對應的資產編號)，
+    都找不到時才用 difflib 對代碼做模糊比對。
+    """
+
+    def __init__(self, symbols, names):
+        order = np.argsort(np.asarray(symbols, dtype=str), kind='stable')
+        self.symbols = np.asarray(symbols, dtype=str)[order]
+        self.names = np.asarray(names, dtype=str)[order]
+        words, owners = [], []
+        for i, name in enumerate(self.names):
+            for w in set(re.findall(r'[a-z0-9]+', name.lower())):
+                words.append(w)
+                owners.append(i)
+        w_order = np.argsort(np.asarray(words, dtype=str), kind='stable')
+        self.words = np.asarray(words, dtype=str)[w_order]
+        self.word_owner = np.asarray(owners, dtype=np.int32)[w_order]
+
+    def __len__(self):
+        return len(self.symbols)
+
+    @staticmethod
+    def _prefix_range(arr, prefix):
+        lo = np.searchsorted(arr, prefix, side='left')
+        hi = np.searchsorted(arr, prefix + '￿', side='left')
+        return lo, hi
+
+    def label(self, i):
+        return f"{self.symbols[i]} - {self.names[i]}"
+
+    def search(self, query, k=TOP_K):
+        """回傳最多 k 筆 "SYM - Name"：代碼完全相符 > 代碼前綴 (短的優先) > 名稱字首 > 模糊比對"""
+        q = query.strip()
+        if not q or not len(self): return []
+        sym_q = q.upper()
+        scores = {}
+
+        def add(i, score):
+            i = int(i)
+            if score > scores.get(i, -1): scores[i] = score
+
+        lo, hi = self._prefix_range(self.symbols, sym_q)
+        for i in range(lo, min(hi, lo + k * 5)):
+            add(i, 100 if self.symbols[i] == sym_q else 90 - len(self.symbols[i]))
+
+        terms = re.findall(r'[a-z0-9]+', q.lower())
+        if terms:
+            # 每個字都要有單字以它開頭 (取交集)
+            matched = None
+            for term in terms:
+                lo, hi = self._prefix_range(self.words, term)
+                owners = set(self.word_owner[lo:hi].tolist())
+                matched = owners if matched is None else matched & owners
+                if not matched: break
+            for i in sorted(matched or ())[:k * 5]:
+                add(i, 60 - min(len(self.names[i]), 50) / 100)
+
+        if len(scores) < k and len(sym_q) >= 2:
+            for sym in difflib.get_close_matches(sym_q, self.symbols.tolist(), n=k, cutoff=0.6):
+                add(np.searchsorted(self.symbols, sym), 30)
+
+        ranked = sorted(scores.items(), key=lambda kv: (-kv[1], self.symbols[kv[0]]))[:k]
+        return [self.label(i) for i, _ in ranked]
+
+    def save(self, path=None):
+        np.savez_compressed(path or CACHE_FILE, symbols=self.symbols, names=self.names, built=np.asarray(_today()))
+
+    @classmethod
+    def load(cls, path=None):
+        """讀本機快取，回傳 (index, 建立日期)；沒有快取時回傳 (None, None)"""
+        path = path or CACHE_FILE
+        if not os.path.exists(path): return None, None
+        with np.load(path, allow_pickle=False) as f:
+            return cls(f['symbols'], f['names']), str(f['built'])
+
+
+def load_index(fetch, path=None):
+    """
+    今天已建立過的快取直接讀取；否則呼叫 fetch() 取得 [(symbol, name)] 重建並存檔。
+    抓取失敗時退回舊快取 (沒有就回傳空索引)。
+    """
+    cached, built = None, None
+    try: cached, built = AssetIndex.load(path)
+    except Exception: pass
+    if cached is not None and built == _today(): return cached
+    try:
+        pairs = fetch()
+        if pairs:
+            index = AssetIndex([p[0] for p in pairs], [p[1] or "" for p in pairs])
+            try: index.save(path)
+            except Exception: pass
+            return index
+    except Exception: pass
+    return cached if cached is not None else AssetIndex([], [])
@@ -0,0 +1,278 @@
+# backtest.py
+import numpy as np
+import pandas as pd
+import indicator_cache
+
+# 交易原因代碼 -> 顯示文字 (對應回測實驗室的交易紀錄)
+EXIT_TREND = 'trend'
+EXIT_STOP = 'stop'
+
+
+def add_strategy_sma(df, sma_short, sma_long, symbol=None):
+    """在 get_market_data 的 K 線上加上策略用的 SMA_S / SMA_L (有 symbol 時走共用指標快取)"""
+    df = df.copy()
+    df['SMA_S'] = indicator_cache.sma(symbol, df, sma_short)
+    df['SMA_L'] = indicator_cache.sma(symbol, df, sma_long)
+    return df
+
+
+def simulate(close, sma_s, sma_l, rsi, start_idx, initial_capital, rsi_buy_max, stop_loss_pct):
+    """
+    核心模擬 (純 NumPy 陣列)：不再逐日 iloc，而是「一筆交易跳一次」。
+    - 進場：close > SMA_S 且 RSI < rsi_buy_max，且資金買得起至少 1 股
+    - 出場：close < SMA_L (趨勢反轉) 優先，其次 close < 進場價 * (1 - 停損)
+    規則與原本的逐日迴圈完全相同 (同一天賣出後不會再買入)。
+    回傳 (equity 陣列, trades)，trades 每筆為
+    (進場 idx, 出場 idx 或 -1, 股數, 進場價, 出場價, 出場原因)。
+    """
+    close = np.asarray(close, dtype=float)
+    n = len(close)
+    start_idx = max(int(start_idx), 0)
+    equity = np.empty(max(n - start_idx, 0), dtype=float)
+    trades = []
+    if n <= start_idx:
+        return equity, trades
+
+    # NaN 比較結果為 False，與原本逐日判斷的行為一致
+    with np.errstate(invalid='ignore'):
+        buy_sig = (close > np.asarray(sma_s, dtype=float)) & (np.asarray(rsi, dtype=float) < rsi_buy_max)
+        trend_exit = close < np.asarray(sma_l, dtype=float)
+
+    cash = float(initial_capital)
+    i = start_idx
+    while i < n:
+        # --- 找下一個進場日 (買得起才算) ---
+        with np.errstate(divide='ignore', invalid='ignore'):
+            can_buy = buy_sig[i:] & (cash / close[i:] >= 1)
+        hits = np.flatnonzero(can_buy)
+        if not len(hits):
+            equity[i - start_idx:] = cash
+            break
+        e = i + hits[0]
+        equity[i - start_idx:e - start_idx] = cash
+
+        entry_price = close[e]
+        position = int(cash / entry_price)
+        cash -= position * entry_price
+
+        # --- 找出場日：跌破長均線或觸發停損 ---
+        stop_price = entry_price * (1 - stop_loss_pct)
+        exits = np.flatnonzero(trend_exit[e + 1:] | (close[e + 1:] < stop_price))
+        if not len(exits):
+            equity[e - start_idx:] = cash + position * close[e:]
+            trades.append((e, -1, position, entry_price, np.nan, None))
+            break
+        x = e + 1 + exits[0]
+        equity[e - start_idx:x - start_idx] = cash + position * close[e:x]
+
+        exit_price = close[x]
+        cash += position * exit_price
+        equity[x - start_idx] = cash
+        trades.append((e, x, position, entry_price, exit_price, EXIT_TREND if trend_exit[x] else EXIT_STOP))
+        i = x + 1
+
+    return equity, trades
+
+
+def max_drawdown(equity):
+    """最大回撤 (負值，例如 -0.25 代表 -25%)"""
+    equity = np.asarray(equity, dtype=float)
+    if not len(equity): return 0.0
+    peak = np.maximum.accumulate(equity)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dd = equity / peak - 1
+    return float(np.nanmin(dd)) if len(dd) else 0.0
+
+
+def summarize(equity, trades, initial_capital, close, start_idx):
+    """計算 KPI：最終資產、報酬率、買入持有報酬、交易次數、勝率、最大回撤"""
+    if not len(equity):
+        return {}
+    final_value = float(equity[-1])
+    closed = [tr for tr in trades if tr[1] >= 0]
+    wins = [tr for tr in closed if (tr[4] - tr[3]) * tr[2] > 0]
+    start_price, end_price = close[start_idx], close[-1]
+    return {
+        'final_value': final_value,
+        'total_return': (final_value - initial_capital) / initial_capital,
+        'bh_return': (end_price - start_price) / start_price,
+        'num_trades': len(closed),
+        'win_rate': len(wins) / len(closed) if closed else 0,
+        'max_drawdown': max_drawdown(equity),
+    }
+
+
+def _trade_log(df, trades, sma_short, sma_long, stop_loss_pct):
+    """把 simulate 的交易轉成原本回測頁面的交易紀錄格式"""
+    dates = df.index
+    log = []
+    for e, x, qty, entry_price, exit_price, reason in trades:
+        log.append({
+            "日期": dates[e].strftime('%Y-%m-%d'), "動作": "🔵 買入", "價格": entry_price,
+            "數量": qty, "損益": 0, "報酬率": "-", "原因": f"站上 SMA{sma_short}"
+        })
+        if x >= 0:
+            profit_pct = (exit_price / entry_price) - 1
+            log.append({
+                "日期": dates[x].strftime('%Y-%m-%d'), "動作": "🔴 賣出", "價格": exit_price,
+                "數量": qty, "損益": (exit_price - entry_price) * qty, "報酬率": f"{profit_pct*100:.1f}%",
+                "原因": f"跌破 SMA{sma_long}" if reason == EXIT_TREND else f"觸發停損 (-{stop_loss_pct*100}%)"
+            })
+    return log
+
+
+def run_backtest(df, sma_short=20, sma_long=50, rsi_buy_max=70, stop_loss_pct=0.10, initial_capital=10000, symbol=None):
+    """
+    回測實驗室的主入口：吃 trading.get_market_data 的 K 線 (需含 close / RSI)，
+    回傳 dict：equity (pd.Series)、trade_log (list of dict)、stats、start_idx、df (含 SMA_S/SMA_L)。
+    """
+    if df.empty:
+        return {'equity': pd.Series(dtype=float), 'trade_log': [], 'stats': {}, 'start_idx': 0, 'df': df}
+
+    df = add_strategy_sma(df, sma_short, sma_long, symbol)
+    start_idx = max(sma_long, 50)
+    close = df['close'].to_numpy(dtype=float)
+    equity, trades = simulate(
+        close, df['SMA_S'].to_numpy(), df['SMA_L'].to_numpy(), df['RSI'].to_numpy(),
+        start_idx, initial_capital, rsi_buy_max, stop_loss_pct
+    )
+    return {
+        'equity': pd.Series(equity, index=df.index[start_idx:start_idx + len(equity)], name='Equity'),
+        'trade_log': _trade_log(df, trades, sma_short, sma_long, stop_loss_pct),
+        'stats': summarize(equity, trades, initial_capital, close, start_idx),
+        'start_idx': start_idx,
+        'df': df,
+    }
+
+
+def run_backtest_many(data, **params):
+    """多檔標的批次回測：data 為 {symbol: df}，回傳 {symbol: run_backtest 結果}"""
+    return {sym: run_backtest(df, symbol=sym, **params) for sym, df in data.items() if not df.empty}
+
+
+# ========================================================
+# 📦 投資組合回測 (多標的共用一個資金池)
+# ========================================================
+SIZING_EQUAL = 'equal'      # 每檔分配 總資產 / 標的數
+SIZING_PERCENT = 'percent'  # 每檔分配 總資產 * position_pct
+SIZING_FIXED = 'fixed'      # 每檔固定金額 position_amount
+
+
+def _align(data, sma_short, sma_long):
+    """把各標的 K 線對齊到同一條日期軸，回傳 (dates, symbols, 各欄位矩陣 T x N)"""
+    symbols = [sym for sym, df in data.items() if not df.empty]
+    frames = {sym: add_strategy_sma(data[sym], sma_short, sma_long, sym) for sym in symbols}
+    for sym, df in frames.items():
+        # 與單一回測相同：每檔從第 max(sma_long, 50) 根 K 線才開始交易
+        df['_active'] = np.arange(len(df)) >= max(sma_long, 50)
+    dates = pd.DatetimeIndex(sorted(set().union(*[df.index for df in frames.values()]))) if frames else pd.DatetimeIndex([])
+
+    def matrix(col, fill=np.nan):
+        if not frames: return np.empty((0, 0))
+        return pd.concat({sym: frames[sym][col] for sym in symbols}, axis=1).reindex(dates).to_numpy(dtype=float, na_value=fill)
+
+    close = matrix('close')
+    mats = {
+        'close': close,
+        'mark': pd.DataFrame(close).ffill().to_numpy(),  # 估值用收盤價 (停牌日沿用前一日)
+        'sma_s': matrix('SMA_S'),
+        'sma_l': matrix('SMA_L'),
+        'rsi': matrix('RSI'),
+        'active': matrix('_active', 0.0) > 0,
+    }
+    return dates, symbols, mats
+
+
+def run_portfolio_backtest(data, sma_short=20, sma_long=50, rsi_buy_max=70, stop_loss_pct=0.10,
+                           initial_capital=10000, sizing=SIZING_EQUAL, position_pct=0.2, position_amount=2000):
+    """
+    多標的投資組合回測：所有標的共用一個現金池，進出場規則與 run_backtest 相同。
+    訊號以 T x N 矩陣一次算完，逐日只做「跨標的」的向量運算 (資金池本質上有先後順序)。
+    回傳 dict：equity (pd.Series)、attribution (DataFrame)、trade_log、stats。
+    """
+    dates, symbols, m = _align(data, sma_short, sma_long)
+    empty = {'equity': pd.Series(dtype=float), 'attribution': pd.DataFrame(), 'trade_log': [], 'stats': {}}
+    if not symbols: return empty
+
+    close, mark = m['close'], m['mark']
+    has_bar = ~np.isnan(close) & m['active']
+    with np.errstate(invalid='ignore'):
+        buy_sig = has_bar & (close > m['sma_s']) & (m['rsi'] < rsi_buy_max)
+        trend_exit = has_bar & (close < m['sma_l'])
+
+    T, N = close.shape
+    first = int(np.argmax(has_bar.any(axis=1))) if has_bar.any() else T
+    cash = float(initial_capital)
+    position = np.zeros(N, dtype=np.int64)
+    entry_price = np.zeros(N)
+    realized = np.zeros(N)
+    n_trades = np.zeros(N, dtype=np.int64)
+    n_wins = np.zeros(N, dtype=np.int64)
+    equity = np.empty(T - first)
+    trade_log = []
+
+    for t in range(first, T):
+        date = dates[t].strftime('%Y-%m-%d')
+        held = position > 0
+
+        # --- 賣出：跌破長均線優先，其次停損 ---
+        with np.errstate(invalid='ignore'):
+            stop_hit = has_bar[t] & (close[t] < entry_price * (1 - stop_loss_pct))
+        sell = held & (trend_exit[t] | stop_hit)
+        for j in np.flatnonzero(sell):
+            price, qty = close[t, j], int(position[j])
+            profit = (price - entry_price[j]) * qty
+            cash += qty * price
+            realized[j] += profit
+            n_trades[j] += 1
+            n_wins[j] += profit > 0
+            trade_log.append({
+                "日期": date, "代碼": symbols[j], "動作": "🔴 賣出", "價格": price, "數量": qty, "損益": profit,
+                "報酬率": f"{(price / entry_price[j] - 1)*100:.1f}%",
+                "原因": f"跌破 SMA{sma_long}" if trend_exit[t, j] else f"觸發停損 (-{stop_loss_pct*100}%)"
+            })
+            position[j] = 0
+            entry_price[j] = 0
+
+        # --- 買入：依清單順序分配資金 (當天剛賣出的不會再買) ---
+        buy = ~held & buy_sig[t]
+        if buy.any():
+            total = cash + float(np.nansum(position * mark[t]))
+            if sizing == SIZING_PERCENT: budget = total * position_pct
+            elif sizing == SIZING_FIXED: budget = float(position_amount)
+            else: budget = total / N
+            for j in np.flatnonzero(buy):
+                price = close[t, j]
+                qty = int(min(budget, cash) / price)
+                if qty <= 0: continue
+                cash -= qty * price
+                position[j] = qty
+                entry_price[j] = price
+                trade_log.append({
+                    "日期": date, "代碼": symbols[j], "動作": "🔵 買入", "價格": price, "數量": qty,
+                    "損益": 0, "報酬率": "-", "原因": f"站上 SMA{sma_short}"
+                })
+
+        equity[t - first] = cash + float(np.nansum(position * mark[t]))
+
+    unrealized = np.where(position > 0, (mark[-1] - entry_price) * position, 0.0)
+    attribution = pd.DataFrame({
+        '代碼': symbols,
+        '已實現損益': realized,
+        '未實現損益': unrealized,
+        '總損益': realized + unrealized,
+        '交易次數': n_trades,
+        '勝率': np.divide(n_wins, n_trades, out=np.zeros(N), where=n_trades > 0),
+        '目前持股': position,
+    }).sort_values('總損益', ascending=False).reset_index(drop=True)
+
+    final_value = float(equity[-1]) if len(equity) else float(initial_capital)
+    stats = {
+        'final_value': final_value,
+        'total_return': (final_value - initial_capital) / initial_capital,
+        'num_trades': int(n_trades.sum()),
+        'win_rate': n_wins.sum() / n_trades.sum() if n_trades.sum() else 0,
+        'max_drawdown': max_drawdown(equity),
+    }
+    return {'equity': pd.Series(equity, index=dates[first:], name='Equity'),
+            'attribution': attribution, 'trade_log': trade_log, 'stats': stats}
@@ -0,0 +1,146 @@
+# bar_store.py
+import os
+import sqlite3
+import pandas as pd
+
+# 本機 K 線資料庫 (SQLite)：重啟或快取過期時，只需補抓最後一根之後的 K 線
+DB_FILE = os.environ.get('BAR_STORE_FILE', 'market_data.sqlite')
+
+COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'trade_count', 'vwap']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bars (
+    symbol TEXT NOT NULL,
+    timeframe TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    open REAL, high REAL, low REAL, close REAL, volume REAL, trade_count REAL, vwap REAL,
+    PRIMARY KEY (symbol, timeframe, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS coverage (
+    symbol TEXT NOT NULL,
+    timeframe TEXT NOT NULL,
+    start_ts INTEGER NOT NULL,
+    PRIMARY KEY (symbol, timeframe)
+);
+"""
+
+
+def connect(path=None):
+    """每次呼叫開一個連線 (可在多執行緒中使用)，WAL 模式讓讀寫互不阻塞"""
+    conn = sqlite3.connect(path or DB_FILE, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _ts(value):
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None: ts = ts.tz_localize('UTC')
+    return int(ts.timestamp())
+
+
+def _day(ts):
+    return pd.Timestamp(ts, unit='s').strftime('%Y-%m-%d')
+
+
+def coverage(conn, symbol, timeframe):
+    """回傳 (已抓取的起始時間, 最後一根 K 線時間)，沒有資料時為 (None, None)"""
+    row = conn.execute("SELECT start_ts FROM coverage WHERE symbol=? AND timeframe=?", (symbol, timeframe)).fetchone()
+    last = conn.execute("SELECT MAX(ts) FROM bars WHERE symbol=? AND timeframe=?", (symbol, timeframe)).fetchone()
+    return (row[0] if row else None), (last[0] if last else None)
+
+
+def save_bars(conn, symbol, timeframe, bars, start_ts=None):
+    """寫入 (或覆蓋) K 線，並更新已涵蓋的起始時間"""
+    if not bars.empty:
+        df = bars.reindex(columns=COLUMNS)
+        rows = [(symbol, timeframe, _ts(t), *vals) for t, vals in zip(df.index, df.itertuples(index=False, name=None))]
+        conn.executemany(
+            f"INSERT OR REPLACE INTO bars (symbol, timeframe, ts, {', '.join(COLUMNS)}) VALUES (?, ?, ?, {', '.join('?' * len(COLUMNS))})",
+            rows
+        )
+    if start_ts is not None:
+        conn.execute(
+            "INSERT INTO coverage (symbol, timeframe, start_ts) VALUES (?, ?, ?) "
+            "ON CONFLICT(symbol, timeframe) DO UPDATE SET start_ts=MIN(start_ts, excluded.start_ts)",
+            (symbol, timeframe, start_ts)
+        )
+    conn.commit()
+
+
+def load_bars(conn, symbol, timeframe, start_ts=0):
+    """讀出 K 線，格式與 api.get_bars(...).df 相同 (UTC 時間索引)"""
+    df = pd.read_sql_query(
+        f"SELECT ts, {', '.join(COLUMNS)} FROM bars WHERE symbol=? AND timeframe=? AND ts>=? ORDER BY ts",
+        conn, params=(symbol, timeframe, start_ts)
+    )
+    df.index = pd.to_datetime(df.pop('ts'), unit='s', utc=True)
+    df.index.name = 'timestamp'
+    return df
+
+
+def get_bars(fetch, symbol, timeframe, start):
+    """
+    先讀本機資料，只向 API 要缺少的部分：
+    - 比已涵蓋起始時間更早的歷史 (回補)
+    - 最後一根之後的新 K 線 (最後一根也重抓，因為盤中的日 K 尚未收定)
+    fetch(symbol, start_str) 需回傳 api.get_bars(...).df 格式的 DataFrame。
+    """
+    tf = str(timeframe)
+    start_ts = _ts(start)
+    conn = connect()
+    try:
+        covered_from, last_ts = coverage(conn, symbol, tf)
+        if covered_from is None or last_ts is None:
+            save_bars(conn, symbol, tf, fetch(symbol, _day(start_ts)), start_ts)
+        else:
+            if start_ts < covered_from:
+                older = fetch(symbol, _day(start_ts))
+                if not older.empty: older = older[older.index < pd.Timestamp(covered_from, unit='s', tz='UTC')]
+                save_bars(conn, symbol, tf, older, start_ts)
+            try:
+                save_bars(conn, symbol, tf, fetch(symbol, _day(last_ts)))
+            except Exception:
+                pass  # 補抓失敗時先用本機資料，下次刷新再補
+        return load_bars(conn, symbol, tf, start_ts)
+    finally:
+        conn.close()
+
+
+def get_bars_many(fetch_many, symbols, timeframe, start, chunk_size=200):
+    """
+    多檔標的批次版 get_bars：依「每檔需要從哪天開始抓」分組，每組只打一次 API (一次帶多個 symbol)，
+    再依 symbol 欄位拆回各自的 K 線存檔。回傳 {symbol: df}。
+    fetch_many(symbols, start_str) 需回傳含 'symbol' 欄位的 api.get_bars([...]).df。
+    """
+    tf = str(timeframe)
+    start_ts = _ts(start)
+    conn = connect()
+    try:
+        groups = {}  # fetch_start -> [symbols]
+        backfill = set()
+        for sym in symbols:
+            covered_from, last_ts = coverage(conn, sym, tf)
+            if covered_from is None or last_ts is None or start_ts < covered_from:
+                groups.setdefault(_day(start_ts), []).append(sym)
+                backfill.add(sym)
+            else:
+                groups.setdefault(_day(last_ts), []).append(sym)
+
+        for fetch_start, syms in groups.items():
+            for i in range(0, len(syms), chunk_size):
+                chunk = syms[i:i + chunk_size]
+                try:
+                    bars = fetch_many(chunk, fetch_start)
+                except Exception:
+                    continue  # 抓取失敗時先用本機資料 (沒有就回傳空表)，下次刷新再補
+                if 'symbol' not in bars.columns:
+                    bars = bars.assign(symbol=chunk[0]) if len(chunk) == 1 and not bars.empty else bars.assign(symbol=None)
+                by_symbol = dict(tuple(bars.groupby('symbol'))) if not bars.empty else {}
+                for sym in chunk:
+                    got = by_symbol.get(sym, bars.iloc[0:0])
+                    save_bars(conn, sym, tf, got.drop(columns='symbol'), start_ts if sym in backfill else None)
+
+        return {sym: load_bars(conn, sym, tf, start_ts) for sym in symbols}
+    finally:
+        conn.close()
@@ -1,8 +1,14 @@
 # brain.py
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import time
 import streamlit as st
 from i18n import t
+import llm_cache
 
 # 嘗試匯入 config，如果沒有也沒關係 (雲端環境可能沒有 config.py)
 try:
@@ -10,21 +16,147 @@ try:
 except ImportError:
     config = None
 
-@st.cache_data(ttl=600)
-def call_gemini_analysis(symbol, full_name, news_text, tech_status, rsi_val, lang):
+# 可用環境變數指向本機假伺服器 (gemini_mock.py) 做離線測試
+GEMINI_API_BASE = os.environ.get('GEMINI_API_BASE', "https://generativelanguage.googleapis.com")
+GEMINI_URL = GEMINI_API_BASE.rstrip('/') + "/v1beta/models/{model}:{method}"
+# 改了 prompt 內容就把版本 +1，舊的快取自動失效
+PROMPT_VERSION = 1
+CANDIDATE_MODELS = ["gemini-2.0-flash", "gemini-flash-latest", "gemini-2.5-flash", "gemini-2.0-flash-exp"]
+# (連線逾時, 讀取逾時) 秒
+GEMINI_TIMEOUT = (3.05, 30)
+# 模型連續失敗幾次就暫停使用，暫停多久 (秒)；模型不存在 (404 / 400 unknown model) 則立刻暫停
+MODEL_FAILURE_THRESHOLD = 3
+MODEL_COOLDOWN = 300
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """共用的 keep-alive 連線池 (避免每次分析都重新做 TLS 握手)"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0)
+            _session.mount("https://", adapter)
+            _session.headers.update({'Content-Type': 'application/json'})
+        return _session
+
+
+class ModelSelector:
+    """
+    記住上次成功的模型 (下次優先使用)，並以簡易斷路器跳過最近失敗的模型：
+    連續失敗達門檻後進入冷卻，冷卻期間不再嘗試；全部都在冷卻時才依序重試。
+    偶發的逾時 / 5xx 只累計次數，fatal (模型不存在之類重試也沒用的錯誤) 才立刻冷卻。
+    """
+
+    def __init__(self, models, failure_threshold=MODEL_FAILURE_THRESHOLD, cooldown=MODEL_COOLDOWN):
+        self.models = list(models)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.last_good = None
+        self._failures = {}      # model -> 連續失敗次數
+        self._open_until = {}    # model -> 冷卻結束時間
+        self._lock = threading.Lock()
+
+    def order(self):
+        """本次要嘗試的模型順序"""
+        now = time.monotonic()
+        with self._lock:
+            ranked = ([self.last_good] if self.last_good else []) + [m for m in self.models if m != self.last_good]
+            available = [m for m in ranked if self._open_until.get(m, 0) <= now]
+            # 全部都在冷卻：依冷卻結束時間排序，至少試一次
+            return available or sorted(ranked, key=lambda m: self._open_until.get(m, 0))
+
+    def success(self, model):
+        with self._lock:
+            self.last_good = model
+            self._failures.pop(model, None)
+            self._open_until.pop(model, None)
+
+    def failure(self, model, fatal=False):
+        with self._lock:
+            self._failures[model] = self._failures.get(model, 0) + 1
+            if fatal or self._failures[model] >= self.failure_threshold:
+                if self.last_good == model: self.last_good = None
+                self._open_until[model] = time.monotonic() + self.cooldown
+
+
+model_selector = ModelSelector(CANDIDATE_MODELS)
+
+def _fatal_status(response):
+    """404，或 400 且錯誤訊息提到 model：這個模型名稱不能用，重試也不會好"""
+    if response.status_code == 404: return True
+    if response.status_code != 400: return False
+    try: return 'model' in response.text.lower()
+    except: return False
+
+def get_api_key():
     api_key = None
     try:
         api_key = st.secrets["GEMINI_API_KEY"]
     except:
         if config and hasattr(config, 'GEMINI_API_KEY'):
             api_key = config.GEMINI_API_KEY
+    return api_key
 
-    # 如果都找不到 Key，就報錯
-    if not api_key:
-        return "⚠️ Please set GEMINI_API_KEY in Secrets or config.py", "gray", []
-    
-    candidate_models = ["gemini-2.0-flash", "gemini-flash-latest", "gemini-2.5-flash", "gemini-2.0-flash-exp"]
-    
+def post_gemini(api_key, payload):
+    """依 model_selector 的順序送出 generateContent，回傳第一個成功的文字；全部失敗回傳 None"""
+    session = get_session()
+
+    # 上次成功的模型優先；最近失敗的模型在冷卻期內直接跳過
+    for model_name in model_selector.order():
+        # 🔥 修改重點 2：使用變數 api_key，而不是 config.GEMINI_API_KEY
+        url = GEMINI_URL.format(model=model_name, method="generateContent")
+        fatal = False
+        try:
+            response = session.post(url, params={'key': api_key.strip()}, data=json.dumps(payload), timeout=GEMINI_TIMEOUT)
+            if response.status_code == 200:
+                result = response.json()
+                try:
+                    text = result['candidates'][0]['content']['parts'][0]['text']
+                    model_selector.success(model_name)
+                    return text
+                except: pass
+            fatal = _fatal_status(response)
+        except: pass
+        model_selector.failure(model_name, fatal)
+    return None
+
+def _chunk_text(event):
+    try: return "".join(p.get('text', '') for p in event['candidates'][0]['content']['parts'])
+    except: return ""
+
+def stream_gemini(api_key, payload):
+    """
+    streamGenerateContent (SSE) 版本：邊收邊 yield 文字片段。
+    還沒收到任何片段前失敗會換下一個模型；串到一半斷線則把例外往外丟 (已送出的片段無法收回)。
+    """
+    session = get_session()
+    for model_name in model_selector.order():
+        url = GEMINI_URL.format(model=model_name, method="streamGenerateContent")
+        started = fatal = False
+        try:
+            with session.post(url, params={'key': api_key.strip(), 'alt': 'sse'}, data=json.dumps(payload),
+                              timeout=GEMINI_TIMEOUT, stream=True) as response:
+                if response.status_code == 200:
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line or not line.startswith('data:'): continue
+                        piece = _chunk_text(json.loads(line[5:]))
+                        if piece:
+                            started = True
+                            yield piece
+                    if started:
+                        model_selector.success(model_name)
+                        return
+                fatal = _fatal_status(response)
+        except Exception:
+            if started:
+                model_selector.failure(model_name)
+                raise
+        model_selector.failure(model_name, fatal)
+
+def analysis_prompt(symbol, full_name, news_text, tech_status, rsi_val, lang):
     prompt_zh = f"""
     你是一位專業的華爾街交易員。請根據以下資訊分析 {symbol} ({full_name})。
     【技術面數據】趨勢：{tech_status}, RSI：{rsi_val}
@@ -46,26 +178,58 @@ def call_gemini_analysis(symbol, full_name, news_text, tech_status, rsi_val, lan
     3. Keywords (3-5 English words)
     """
 
-    prompt_text = prompt_zh if lang == 'zh' else prompt_en
-    payload = {"contents": [{"parts": [{"text": prompt_text}]}]}
-    headers = {'Content-Type': 'application/json'}
+    return prompt_zh if lang == 'zh' else prompt_en
 
-    for model_name in candidate_models:
-        # 🔥 修改重點 2：使用變數 api_key，而不是 config.GEMINI_API_KEY
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent?key={api_key.strip()}"
-        try:
-            response = requests.post(url, headers=headers, data=json.dumps(payload))
-            if response.status_code == 200:
-                result = response.json()
-                try:
-                    return result['candidates'][0]['content']['parts'][0]['text']
-                except: continue
-        except: continue
+@st.cache_data(ttl=600)
+def call_gemini_analysis(symbol, full_name, news_text, tech_status, rsi_val, lang):
+    api_key = get_api_key()
+
+    # 如果都找不到 Key，就報錯
+    if not api_key:
+        return "⚠️ Please set GEMINI_API_KEY in Secrets or config.py", "gray", []
+
+    prompt_text = analysis_prompt(symbol, full_name, news_text, tech_status, rsi_val, lang)
+    payload = {"contents": [{"parts": [{"text": prompt_text}]}]}
+    text = post_gemini(api_key, payload)
+    if text is not None: return text
             
     return "⚠️ Gemini Connection Failed (Check API Key or Quota).", "gray", []
 
-def generate_ai_report(symbol, full_name, news_list, df):
-    lang = st.session_state.get('language', 'zh')
+def parse_report(raw_response):
+    """把 Gemini 三行回覆拆成 (summary, color, keywords)"""
+    if isinstance(raw_response, tuple): return raw_response
+    if isinstance(raw_response, str) and "⚠️" in raw_response: return raw_response, "gray", []
+
+    try:
+        lines = raw_response.strip().split('\n')
+        lines = [l for l in lines if l.strip()]
+        mood_line = lines[0]
+        color = mood_color(mood_line)
+
+        summary = lines[1].replace("分析摘要：", "").replace("Summary:", "").replace("2. ", "").strip()
+        # 關鍵字那行可能沒有 (例如批次回覆的 keywords 是空的)：當成沒有關鍵字，不要整份退回原文
+        keywords_str = lines[2].replace("關鍵字：", "").replace("Keywords:", "").replace("3. ", "").strip() if len(lines) > 2 else ""
+        keywords = [k.strip() for k in keywords_str.split(',') if k.strip()]
+        return summary, color, keywords
+    except: return raw_response, "gray", []
+
+def parse_partial(raw_response):
+    """串流中途的半成品：回傳 (情緒行, 目前為止的摘要, color)，還沒收到的部分為空字串"""
+    lines = [l for l in raw_response.strip().split('\n') if l.strip()]
+    if not lines: return "", "", "info"
+    mood_line = lines[0].replace("1. ", "").strip()
+    summary = lines[1].replace("分析摘要：", "").replace("Summary:", "").replace("2. ", "").strip() if len(lines) > 1 else ""
+    return mood_line, summary, mood_color(lines[0])
+
+def mood_color(mood_line):
+    color = "info"
+    if any(x in mood_line for x in ["樂觀", "Optimistic"]): color = "success"
+    elif any(x in mood_line for x in ["悲觀", "Pessimistic"]): color = "error"
+    elif any(x in mood_line for x in ["矛盾", "陷阱", "Trap", "謹慎"]): color = "warning"
+    return color
+
+def tech_state(symbol, df):
+    """從 K 線最後一列取出 (趨勢, RSI)"""
     tech_status = "Neutral"
     rsi_val = 50
     if not df.empty:
@@ -75,25 +239,170 @@ def generate_ai_report(symbol, full_name, news_list, df):
         if sma20 > sma200: tech_status = "Bull"
         elif sma20 < sma200: tech_status = "Bear"
         if symbol in ['SGOV', 'SHV', 'BIL', 'USFR']: tech_status = "Cash"
+    return tech_status, rsi_val
 
-    if not news_list: return t('quiet'), "gray", []
+def cached_analysis(symbol, full_name, news_list, tech_status, rsi_val, lang):
+    """先查本機內容定址快取 (同一批新聞 + 同樣技術面 = 同一個 key)，沒命中才呼叫 Gemini 並寫回"""
     news_text = "".join([f"- {n['headline']}\n" for n in news_list])
-    
+    cache_key = None
+    try:
+        cache_key = llm_cache.make_key(symbol, [n['headline'] for n in news_list], tech_status, rsi_val, lang, PROMPT_VERSION)
+        hit = llm_cache.get(cache_key)
+        if hit is not None: return hit
+    except Exception: pass
+
     raw_response = call_gemini_analysis(symbol, full_name, news_text, tech_status, rsi_val, lang)
-    if isinstance(raw_response, tuple): return raw_response
-    if isinstance(raw_response, str) and "⚠️" in raw_response: return raw_response, "gray", []
+    if cache_key and isinstance(raw_response, str) and "⚠️" not in raw_response:
+        try: llm_cache.put(cache_key, raw_response)
+        except Exception: pass
+    return raw_response
+
+def stream_ai_report(symbol, full_name, news_list, df, lang=None):
+    """
+    串流版的 AI 分析：yield 目前累積的原始回覆 (三行格式)，UI 可邊收邊畫。
+    本機快取命中時只 yield 一次完整文字；串流完成後把完整文字寫回快取，下次直接命中。
+    """
+    lang = lang or st.session_state.get('language', 'zh')
+    tech_status, rsi_val = tech_state(symbol, df)
+    if not news_list:
+        yield t('quiet')
+        return
 
+    cache_key = None
     try:
-        lines = raw_response.strip().split('\n')
-        lines = [l for l in lines if l.strip()]
-        mood_line = lines[0]
-        color = "info"
-        if any(x in mood_line for x in ["樂觀", "Optimistic"]): color = "success"
-        elif any(x in mood_line for x in ["悲觀", "Pessimistic"]): color = "error"
-        elif any(x in mood_line for x in ["矛盾", "陷阱", "Trap", "謹慎"]): color = "warning"
+        cache_key = llm_cache.make_key(symbol, [n['headline'] for n in news_list], tech_status, rsi_val, lang, PROMPT_VERSION)
+        hit = llm_cache.get(cache_key)
+        if hit is not None:
+            yield hit
+            return
+    except Exception: pass
 
-        summary = lines[1].replace("分析摘要：", "").replace("Summary:", "").replace("2. ", "").strip()
-        keywords_str = lines[2].replace("關鍵字：", "").replace("Keywords:", "").replace("3. ", "").strip()
-        keywords = [k.strip() for k in keywords_str.split(',')]
-        return summary, color, keywords
-    except: return raw_response, "gray", []
\ No newline at end of file
+    api_key = get_api_key()
+    if not api_key:
+        yield "⚠️ Please set GEMINI_API_KEY in Secrets or config.py"
+        return
+
+    news_text = "".join([f"- {n['headline']}\n" for n in news_list])
+    payload = {"contents": [{"parts": [{"text": analysis_prompt(symbol, full_name, news_text, tech_status, rsi_val, lang)}]}]}
+    raw = ""
+    try:
+        for piece in stream_gemini(api_key, payload):
+            raw += piece
+            yield raw
+    except Exception:
+        # 串到一半斷線：保留已收到的內容，但不寫入快取
+        yield raw + "\n⚠️ Gemini stream interrupted."
+        return
+    if not raw:
+        yield "⚠️ Gemini Connection Failed (Check API Key or Quota)."
+        return
+    if cache_key:
+        try: llm_cache.put(cache_key, raw)
+        except Exception: pass
+
+def generate_ai_report(symbol, full_name, news_list, df):
+    lang = st.session_state.get('language', 'zh')
+    tech_status, rsi_val = tech_state(symbol, df)
+
+    if not news_list: return t('quiet'), "gray", []
+    raw_response = cached_analysis(symbol, full_name, news_list, tech_status, rsi_val, lang)
+    return parse_report(raw_response)
+
+# ========================================================
+# 🧠 批次分析：整份監控清單一次看情緒
+# ========================================================
+BATCH_CHUNK_SIZE = 5
+BATCH_MAX_WORKERS = 4
+
+def _batch_prompt(items, lang):
+    blocks = []
+    for it in items:
+        news = "".join([f"  - {n['headline']}\n" for n in it['news']])
+        blocks.append(f"### {it['symbol']} ({it['name']})\nTrend: {it['trend']}, RSI: {it['rsi']}\nNews:\n{news}")
+    body = "\n".join(blocks)
+    if lang == 'zh':
+        return f"""
+    你是一位專業的華爾街交易員。請分別分析以下每一檔標的。
+    {body}
+    【要求】用繁體中文(台灣用語)。若技術面空頭但新聞好請警告誘多。
+    只回傳 JSON 陣列，每檔一個物件：
+    [{{"symbol": "代碼", "sentiment": "中立客觀情緒 (例如：樂觀/悲觀/謹慎/誘多)", "summary": "分析摘要(100字)", "keywords": ["3-5個英文關鍵字"]}}]
+    """
+    return f"""
+    You are a seasoned Wall Street trader. Analyze each symbol below separately.
+    {body}
+    [Req] Use trader jargon. Warn Bull Traps.
+    Return ONLY a JSON array, one object per symbol:
+    [{{"symbol": "SYM", "sentiment": "Sentiment", "summary": "Summary (100 words)", "keywords": ["3-5 English keywords"]}}]
+    """
+
+def _parse_batch(text):
+    """解析批次回覆的 JSON 陣列 -> {symbol: 三行文字 (與單檔回覆同格式)}"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        if text.startswith("json"): text = text[4:]
+    out = {}
+    for row in json.loads(text):
+        try:
+            keywords = row.get('keywords') or []
+            if isinstance(keywords, str): keywords = [k.strip() for k in keywords.split(',')]
+            sentiment, summary = (" ".join(str(row[k]).split()) for k in ('sentiment', 'summary'))
+            out[str(row['symbol']).upper()] = f"{sentiment}\n{summary}\n{', '.join(keywords)}"
+        except Exception: continue
+    return out
+
+def _analyze_chunk(api_key, chunk, lang):
+    payload = {
+        "contents": [{"parts": [{"text": _batch_prompt(chunk, lang)}]}],
+        "generationConfig": {"responseMimeType": "application/json"},
+    }
+    text = post_gemini(api_key, payload)
+    if text is None: return {}
+    try: return _parse_batch(text)
+    except Exception: return {}
+
+def generate_batch_reports(items, lang=None, chunk_size=BATCH_CHUNK_SIZE, max_workers=BATCH_MAX_WORKERS):
+    """
+    多檔一起分析：把數檔的新聞與技術面打包成一個 prompt (每包 chunk_size 檔)，各包並行送出，
+    再把 JSON 結果拆回每檔的 (summary, color, keywords)。已在本機快取的標的不會再送。
+    items 為 [{'symbol', 'name', 'news', 'df'}]，回傳 {symbol: (summary, color, keywords)}。
+    """
+    lang = lang or st.session_state.get('language', 'zh')
+    results, pending = {}, []
+    for it in items:
+        sym = it['symbol']
+        if not it.get('news'):
+            results[sym] = (t('quiet'), "gray", [])
+            continue
+        trend, rsi_val = tech_state(sym, it['df'])
+        key = None
+        try:
+            # 批次 prompt 與單檔不同，版本標記分開，兩邊的快取不互相混用
+            key = llm_cache.make_key(sym, [n['headline'] for n in it['news']], trend, rsi_val, lang, f"{PROMPT_VERSION}-batch")
+            hit = llm_cache.get(key)
+            if hit is not None:
+                results[sym] = parse_report(hit)
+                continue
+        except Exception: pass
+        pending.append({**it, 'name': it.get('name') or sym, 'trend': trend, 'rsi': rsi_val, 'key': key})
+
+    api_key = get_api_key()
+    if pending and not api_key:
+        for it in pending: results[it['symbol']] = ("⚠️ Please set GEMINI_API_KEY in Secrets or config.py", "gray", [])
+        return results
+
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    if chunks:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+            for chunk, parsed in zip(chunks, pool.map(lambda c: _analyze_chunk(api_key, c, lang), chunks)):
+                for it in chunk:
+                    raw = parsed.get(it['symbol'].upper())
+                    if raw is None:
+                        results[it['symbol']] = ("⚠️ Gemini Connection Failed (Check API Key or Quota).", "gray", [])
+                        continue
+                    if it['key']:
+                        try: llm_cache.put(it['key'], raw)
+                        except Exception: pass
+                    results[it['symbol']] = parse_report(raw)
+    return results
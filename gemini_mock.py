@@ -0,0 +1,89 @@
+# gemini_mock.py
+"""
+本機 Gemini 假伺服器 (離線測試串流用，不需要 API Key、不耗額度)。
+
+    python gemini_mock.py --port 8765 --delay 0.1
+    GEMINI_API_BASE=http://127.0.0.1:8765 streamlit run app.py
+
+支援 generateContent (一次回完整 JSON) 與 streamGenerateContent?alt=sse (逐段送出 data: 行)。
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = (
+    "1. 謹慎\n"
+    "2. 分析摘要：短線趨勢仍在年線之上，但 RSI 偏高且新聞多為利多消息，追價前留意誘多風險，拉回均線附近再分批布局較穩健。\n"
+    "3. 關鍵字：Momentum, Overbought, Earnings"
+)
+
+
+def split_chunks(text, size=12):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _event(text):
+    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+
+
+class MockGeminiHandler(BaseHTTPRequestHandler):
+    reply = DEFAULT_REPLY
+    delay = 0.05        # 每段之間的間隔 (秒)
+    chunk_size = 12
+    fail_models = ()    # 這些模型一律回 503，用來測試換模型
+
+    def do_POST(self):
+        m = re.match(r'^/v1beta/models/([^:/]+):(\w+)', self.path)
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if not m:
+            self.send_error(404)
+            return
+        model, method = m.groups()
+        if model in self.fail_models:
+            self.send_error(503)
+            return
+
+        if method == 'generateContent':
+            body = json.dumps(_event(self.reply)).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif method == 'streamGenerateContent':
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.end_headers()
+            for piece in split_chunks(self.reply, self.chunk_size):
+                self.wfile.write(f"data: {json.dumps(_event(piece), ensure_ascii=False)}\r\n\r\n".encode('utf-8'))
+                self.wfile.flush()
+                if self.delay: time.sleep(self.delay)
+        else:
+            self.send_error(404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start(port=0, delay=0.05, reply=DEFAULT_REPLY, fail_models=()):
+    """在背景執行緒啟動假伺服器，回傳 (server, base_url)；port=0 代表隨機可用埠"""
+    handler = type('Handler', (MockGeminiHandler,), {'delay': delay, 'reply': reply, 'fail_models': tuple(fail_models)})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local mock Gemini server')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.05, help='每段之間的間隔 (秒)')
+    args = parser.parse_args()
+    server, base = start(args.port, args.delay)
+    print(f"Mock Gemini listening on {base}")
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,170 @@
+# greeks.py
+import math
+import numpy as np
+import pandas as pd
+
+# Black-Scholes 定價 / 隱含波動率 / Greeks，全部以 NumPy 向量化，一次處理整條期權鏈
+RISK_FREE_RATE = 0.045
+IV_LOW, IV_HIGH = 1e-4, 5.0
+IV_TOL = 1e-6
+IV_MAX_ITER = 60
+DELTA_TARGETS = {'ITM': 0.70, 'ATM': 0.50, 'OTM': 0.30}
+
+_SQRT2 = np.sqrt(2.0)
+_INV_SQRT_2PI = 1.0 / np.sqrt(2.0 * np.pi)
+
+
+_erf = np.vectorize(math.erf, otypes=[float])  # 精確到機器精度；近似公式 (誤差 ~1e-7) 會讓深價內 / 價外的隱含波動率反解失敗
+
+
+def norm_cdf(x):
+    return 0.5 * (1.0 + _erf(np.asarray(x, dtype=float) / _SQRT2))
+
+
+def norm_pdf(x):
+    x = np.asarray(x, dtype=float)
+    return _INV_SQRT_2PI * np.exp(-0.5 * x * x)
+
+
+def _d1_d2(S, K, T, r, sigma):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vol_t = sigma * np.sqrt(T)
+        d1 = (np.log(S / K) + (r + 0.5 * sigma * sigma) * T) / vol_t
+    return d1, d1 - vol_t
+
+
+def bs_price(S, K, T, r, sigma, is_call):
+    """歐式期權理論價；參數皆可為陣列 (會 broadcast)"""
+    S, K, T, sigma = (np.asarray(v, dtype=float) for v in (S, K, T, sigma))
+    is_call = np.asarray(is_call, dtype=bool)
+    d1, d2 = _d1_d2(S, K, T, r, sigma)
+    disc = K * np.exp(-r * T)
+    call = S * norm_cdf(d1) - disc * norm_cdf(d2)
+    put = disc * norm_cdf(-d2) - S * norm_cdf(-d1)
+    return np.where(is_call, call, put)
+
+
+def vega(S, K, T, r, sigma):
+    d1, _ = _d1_d2(S, K, T, r, np.asarray(sigma, dtype=float))
+    return S * norm_pdf(d1) * np.sqrt(T)
+
+
+def implied_vol(price, S, K, T, r, is_call, tol=IV_TOL, max_iter=IV_MAX_ITER):
+    """
+    批次解隱含波動率：每個合約各自維護 [lo, hi] 區間，先試 Newton 步，
+    跳出區間 (或 vega 太小) 就改用二分法。價內合約先用買賣權平價換成同履約價的價外合約 (只剩時間價值) 再解，
+    避免深價內時拿「大價格相減」比較而失準。超出無套利範圍的回傳 NaN；時間價值為 0 的回傳 IV_LOW (delta ±1)。
+    """
+    arrays = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (price, S, K, T)), np.asarray(is_call, dtype=bool))
+    shape = arrays[0].shape
+    price, S, K, T, is_call = (a.ravel() for a in arrays)
+    disc = K * np.exp(-r * T)
+    lower = np.where(is_call, np.maximum(S - disc, 0.0), np.maximum(disc - S, 0.0))
+    upper = np.where(is_call, S, disc)
+    # 剛好等於內含價值 (深價內的時間價值小於浮點精度) 視為 IV_LOW；明顯低於內含價值的報價仍回傳 NaN
+    quoted = np.isfinite(price) & (T > 0) & (price >= lower * (1 - 1e-9)) & (price < upper)
+    valid = quoted & (price > lower)
+    otm_price = price - lower
+    otm_call = is_call ^ (lower > 0)
+
+    lo = np.full(price.shape, IV_LOW)
+    hi = np.full(price.shape, IV_HIGH)
+    sigma = np.full(price.shape, 0.3)
+    idx = np.nonzero(valid)[0]
+    for _ in range(max_iter):
+        if not len(idx): break
+        s, k, tt, p, c, sig = S[idx], K[idx], T[idx], otm_price[idx], otm_call[idx], sigma[idx]
+        diff = bs_price(s, k, tt, r, sig, c) - p
+        v = vega(s, k, tt, r, sig)
+
+        # 價格隨 sigma 單調遞增：依 diff 正負縮小區間
+        hi[idx] = h = np.where(diff > 0, sig, hi[idx])
+        lo[idx] = l = np.where(diff <= 0, sig, lo[idx])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            newton = sig - diff / v
+        use_newton = (v > 1e-12) & (newton > l) & (newton < h)
+        done = (np.abs(diff) < tol * np.minimum(p, 1.0)) | (h - l < tol * 1e-2)
+        sigma[idx] = np.where(done, sig, np.where(use_newton, newton, 0.5 * (l + h)))
+        idx = idx[~done]
+    sigma = np.where(valid, sigma, IV_LOW)
+    return np.where(quoted, sigma, np.nan).reshape(shape)
+
+
+def greeks(S, K, T, r, sigma, is_call):
+    """回傳 dict：delta、gamma、theta (每日)、vega (波動率每 1% )"""
+    S, K, T, sigma = (np.asarray(v, dtype=float) for v in (S, K, T, sigma))
+    is_call = np.asarray(is_call, dtype=bool)
+    d1, d2 = _d1_d2(S, K, T, r, sigma)
+    pdf = norm_pdf(d1)
+    sqrt_t = np.sqrt(T)
+    disc = K * np.exp(-r * T)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gamma = pdf / (S * sigma * sqrt_t)
+        decay = -S * pdf * sigma / (2 * sqrt_t)
+    theta_call = decay - r * disc * norm_cdf(d2)
+    theta_put = decay + r * disc * norm_cdf(-d2)
+    return {
+        'delta': np.where(is_call, norm_cdf(d1), norm_cdf(d1) - 1.0),
+        'gamma': gamma,
+        'theta': np.where(is_call, theta_call, theta_put) / 365.0,
+        'vega': S * pdf * sqrt_t / 100.0,
+    }
+
+
+def year_fraction(expiration, today=None):
+    """到期日 (YYYY-MM-DD) -> 年化剩餘時間 (至少一天)"""
+    today = pd.Timestamp(today or pd.Timestamp.now().normalize())
+    days = (pd.Timestamp(expiration) - today).days
+    return max(days, 1) / 365.0
+
+
+def analyze_chain(df, spot, T, is_call, r=RISK_FREE_RATE):
+    """
+    對 yfinance 的 option_chain (calls 或 puts) 整表計算 mid、iv、delta、gamma、theta、vega。
+    mid 取 (bid + ask) / 2，沒有報價時退回 lastPrice。回傳新的 DataFrame。
+    """
+    out = df.copy()
+    if out.empty: return out
+    bid = out.get('bid', pd.Series(0.0, index=out.index)).fillna(0).to_numpy(float)
+    ask = out.get('ask', pd.Series(0.0, index=out.index)).fillna(0).to_numpy(float)
+    last = out.get('lastPrice', pd.Series(np.nan, index=out.index)).to_numpy(float)
+    mid = np.where((bid > 0) & (ask > 0), 0.5 * (bid + ask), np.where(ask > 0, ask, last))
+    strike = out['strike'].to_numpy(float)
+
+    iv = implied_vol(mid, spot, strike, T, r, is_call)
+    g = greeks(spot, strike, T, r, iv, is_call)
+    out['mid'] = mid
+    out['iv'] = iv
+    for name, values in g.items(): out[name] = values
+    return out
+
+
+def pick_by_delta(df, targets=DELTA_TARGETS):
+    """依 |delta| 目標挑合約：回傳 {名稱: row}，沒有有效 delta 時為 None"""
+    valid = df[np.isfinite(df['delta'])] if 'delta' in df else df.iloc[:0]
+    picks = {}
+    for name, target in targets.items():
+        picks[name] = valid.loc[(valid['delta'].abs() - target).abs().idxmin()] if not valid.empty else None
+    return picks
+
+
+def scan_expirations(chains, spot, is_call, target_delta=0.5, r=RISK_FREE_RATE, today=None):
+    """
+    跨到期日掃描：chains 為 {到期日: calls 或 puts DataFrame}，
+    每個到期日取 |delta| 最接近 target_delta 的合約，回傳一張表 (含 iv、theta、每 1% 波動的 vega)。
+    """
+    rows = []
+    for exp, df in chains.items():
+        if df is None or df.empty: continue
+        T = year_fraction(exp, today)
+        res = analyze_chain(df, spot, T, is_call, r)
+        res = res[np.isfinite(res['delta'])]
+        if res.empty: continue
+        best = res.loc[(res['delta'].abs() - target_delta).abs().idxmin()]
+        rows.append({
+            'expiration': exp, 'dte': int(round(T * 365)), 'contractSymbol': best.get('contractSymbol'),
+            'strike': best['strike'], 'mid': best['mid'], 'iv': best['iv'], 'delta': best['delta'],
+            'gamma': best['gamma'], 'theta': best['theta'], 'vega': best['vega'],
+            'theta_pct': best['theta'] / best['mid'] if best['mid'] else np.nan,
+        })
+    return pd.DataFrame(rows)
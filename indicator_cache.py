@@ -0,0 +1,91 @@
+# indicator_cache.py
+import threading
+from collections import OrderedDict
+import indicators
+
+# 最多保留幾條指標序列 (超過就淘汰最久沒用到的)
+MAX_ENTRIES = 2048
+DEFAULT_TIMEFRAME = '1Day'
+
+
+class LRUCache:
+    """執行緒安全的 LRU 快取 (OrderedDict 實作)"""
+
+    def __init__(self, maxsize=MAX_ENTRIES):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+_cache = LRUCache()
+
+
+def _last_bar(bars):
+    """最後一根 K 線的內容：盤中這根還會被改寫 (收盤價、量)，所以要放進 key"""
+    last = bars.iloc[-1]
+    return tuple(float(last[c]) for c in ('open', 'high', 'low', 'close', 'volume') if c in bars.columns)
+
+
+def cached_series(symbol, bars, name, params, compute, timeframe=DEFAULT_TIMEFRAME, sliceable=False):
+    """
+    共用指標快取：key = (symbol, timeframe, 最後一根 K 線時間與 OHLCV, 指標, 參數)，
+    盤中最後一根被改寫時自然換成新的 key。
+    sliceable=True (SMA 這類只看視窗內資料的指標)：每檔只保留一條在最長歷史上算的序列，
+    較短的 K 線 (例如回測的 tail(300)) 直接切片回傳，結果與重算相同；遇到更長的歷史才重算並取代。
+    RSI 等遞迴指標的值跟歷史起點有關，key 另外加上第一根時間與根數，只在起點完全相同時命中。
+    symbol 為 None 時不使用快取。
+    """
+    if symbol is None or bars.empty:
+        return compute(bars['close'])
+    key = (symbol, str(timeframe), bars.index[-1], _last_bar(bars), name, params)
+    if not sliceable: key += (bars.index[0], len(bars))
+    hit = _cache.get(key)
+    if hit is not None and (not sliceable or hit.index[0] <= bars.index[0]):
+        return hit.reindex(bars.index) if sliceable else hit.copy()
+    series = compute(bars['close'])
+    _cache.put(key, series)
+    return series.copy()
+
+
+def sma(symbol, bars, window, timeframe=DEFAULT_TIMEFRAME):
+    """例如 sma('NVDA', df, 50) -> 以 df 最後一根為準的 SMA50 序列"""
+    return cached_series(symbol, bars, 'SMA', (int(window),), lambda c: indicators.sma_series(c, int(window)), timeframe, sliceable=True)
+
+
+def rsi(symbol, bars, period=indicators.RSI_PERIOD, timeframe=DEFAULT_TIMEFRAME):
+    return cached_series(symbol, bars, 'RSI', (int(period),), lambda c: indicators.rsi_series(c, int(period)), timeframe)
+
+
+def stats():
+    """命中率統計 (除錯用)"""
+    return {'entries': len(_cache), 'hits': _cache.hits, 'misses': _cache.misses}
+
+
+def clear():
+    _cache.clear()
@@ -0,0 +1,197 @@
+# indicators.py
+import math
+from collections import deque
+
+# get_market_data 用到的指標：SMA20 / SMA50 / SMA200 + RSI(14, Wilder)
+DEFAULT_SMA_WINDOWS = (20, 50, 200)
+RSI_PERIOD = 14
+
+
+def sma_series(close, window):
+    """批次版 SMA (整段歷史一次算)"""
+    return close.rolling(window=window).mean()
+
+
+def rsi_series(close, period=RSI_PERIOD):
+    """批次版 RSI (Wilder 平滑，ewm adjust=False)"""
+    delta = close.diff()
+    gain = (delta.where(delta > 0, 0)).fillna(0)
+    loss = (-delta.where(delta < 0, 0)).fillna(0)
+    avg_gain = gain.ewm(alpha=1/period, min_periods=period, adjust=False).mean()
+    avg_loss = loss.ewm(alpha=1/period, min_periods=period, adjust=False).mean()
+    rs = avg_gain / avg_loss
+    return 100 - (100 / (1 + rs))
+
+
+class RollingMean:
+    """
+    O(1) 滑動平均：維護視窗內的累計和。
+    加減法採用與 pandas rolling().mean() 相同的 Kahan 補償與邊界處理，結果和批次計算逐位元相同。
+    """
+
+    def __init__(self, window):
+        self.window = int(window)
+        self._values = deque()
+        self._sum = 0.0
+        self._comp_add = 0.0
+        self._comp_remove = 0.0
+        self._nobs = 0
+        self._neg_ct = 0
+        self._same_ct = 0
+        self._prev = math.nan
+        self._undo = None
+        self.value = math.nan
+
+    def _add(self, val):
+        if val != val: return
+        self._nobs += 1
+        y = val - self._comp_add
+        t = self._sum + y
+        self._comp_add = t - self._sum - y
+        self._sum = t
+        if math.copysign(1.0, val) < 0: self._neg_ct += 1
+        self._same_ct = self._same_ct + 1 if val == self._prev else 1
+        self._prev = val
+
+    def _remove(self, val):
+        if val != val: return
+        self._nobs -= 1
+        y = -val - self._comp_remove
+        t = self._sum + y
+        self._comp_remove = t - self._sum - y
+        self._sum = t
+        if math.copysign(1.0, val) < 0: self._neg_ct -= 1
+
+    def _calc(self):
+        if self._nobs < self.window or self._nobs == 0:
+            return math.nan
+        result = self._sum / self._nobs
+        if self._same_ct >= self._nobs: return self._prev
+        if self._neg_ct == 0 and result < 0: return 0.0
+        if self._neg_ct == self._nobs and result > 0: return 0.0
+        return result
+
+    def update(self, val, replace=False):
+        """加入一根新 K 線的收盤價；replace=True 代表改寫最後一根 (盤中尚未收定的日 K)"""
+        val = float(val)
+        if replace and self._undo is not None:
+            state, removed = self._undo
+            self._values.pop()
+            if removed is not None: self._values.appendleft(removed)
+            (self._sum, self._comp_add, self._comp_remove, self._nobs,
+             self._neg_ct, self._same_ct, self._prev) = state
+        state = (self._sum, self._comp_add, self._comp_remove, self._nobs,
+                 self._neg_ct, self._same_ct, self._prev)
+        removed = None
+        if len(self._values) >= self.window:
+            removed = self._values.popleft()
+            self._remove(removed)
+        self._values.append(val)
+        self._add(val)
+        self._undo = (state, removed)
+        self.value = self._calc()
+        return self.value
+
+
+class WilderRSI:
+    """
+    O(1) RSI：以 Wilder 平滑 (alpha = 1/period) 維護平均漲幅 / 跌幅，
+    與 get_market_data 的 ewm(alpha=1/14, adjust=False, min_periods=14) 結果相同。
+    """
+
+    def __init__(self, period=RSI_PERIOD):
+        self.period = int(period)
+        self.alpha = 1.0 / self.period
+        self._prev_close = math.nan
+        self._avg_gain = math.nan
+        self._avg_loss = math.nan
+        self._nobs = 0
+        self._undo = None
+        self.value = math.nan
+
+    def _smooth(self, avg, cur):
+        if avg != avg: return cur
+        if avg != cur:
+            old_wt = 1.0 - self.alpha
+            avg = (old_wt * avg + self.alpha * cur) / (old_wt + self.alpha)
+        return avg
+
+    def update(self, close, replace=False):
+        """加入一根新 K 線的收盤價；replace=True 代表改寫最後一根"""
+        close = float(close)
+        if replace and self._undo is not None:
+            self._prev_close, self._avg_gain, self._avg_loss, self._nobs = self._undo
+        self._undo = (self._prev_close, self._avg_gain, self._avg_loss, self._nobs)
+
+        delta = close - self._prev_close
+        gain = delta if delta > 0 else 0.0
+        loss = -(delta if delta < 0 else 0.0)
+        self._prev_close = close
+        self._nobs += 1
+        self._avg_gain = self._smooth(self._avg_gain, gain)
+        self._avg_loss = self._smooth(self._avg_loss, loss)
+
+        if self._nobs < self.period:
+            self.value = math.nan
+        elif self._avg_loss == 0:
+            # 與 pandas 除以 0 的結果一致：只有漲 -> 100，完全沒波動 -> NaN
+            self.value = math.nan if self._avg_gain == 0 else 100.0
+        else:
+            self.value = 100 - (100 / (1 + self._avg_gain / self._avg_loss))
+        return self.value
+
+
+class SymbolIndicators:
+    """單一標的的指標狀態 (SMA 多條 + RSI)"""
+
+    def __init__(self, sma_windows=DEFAULT_SMA_WINDOWS, rsi_period=RSI_PERIOD):
+        self.smas = {w: RollingMean(w) for w in sma_windows}
+        self.rsi = WilderRSI(rsi_period)
+        self.close = math.nan
+
+    def update(self, close, replace=False):
+        self.close = float(close)
+        for sma in self.smas.values(): sma.update(close, replace)
+        self.rsi.update(close, replace)
+        return self.snapshot()
+
+    def snapshot(self):
+        """與 get_market_data 最後一列相同的欄位名稱：close / SMA20 / SMA50 / SMA200 / RSI"""
+        out = {'close': self.close, 'RSI': self.rsi.value}
+        out.update({f'SMA{w}': sma.value for w, sma in self.smas.items()})
+        return out
+
+
+class IndicatorEngine:
+    """
+    串流指標引擎：每檔標的保留一份 SymbolIndicators，新 K 線進來時 O(1) 更新，
+    不必每次 rerun / 每個 tick 都對整段歷史重算 rolling / ewm。
+    """
+
+    def __init__(self, sma_windows=DEFAULT_SMA_WINDOWS, rsi_period=RSI_PERIOD):
+        self.sma_windows = tuple(sma_windows)
+        self.rsi_period = rsi_period
+        self._states = {}
+
+    def seed(self, symbol, closes):
+        """用歷史收盤價初始化 (例如 get_market_data 的 close 欄位)"""
+        state = SymbolIndicators(self.sma_windows, self.rsi_period)
+        for c in closes: state.update(c)
+        self._states[symbol] = state
+        return state.snapshot()
+
+    def update(self, symbol, close, replace=False):
+        """新 K 線 (replace=False) 或改寫最後一根 (replace=True)，回傳最新指標"""
+        if symbol not in self._states:
+            self._states[symbol] = SymbolIndicators(self.sma_windows, self.rsi_period)
+        return self._states[symbol].update(close, replace)
+
+    def drop(self, symbol):
+        self._states.pop(symbol, None)
+
+    def snapshot(self, symbol):
+        state = self._states.get(symbol)
+        return state.snapshot() if state else None
+
+    def symbols(self):
+        return list(self._states)
@@ -0,0 +1,274 @@
+# live_feed.py
+import threading
+import time
+from collections import deque
+import pandas as pd
+import indicators
+
+MARKET_TZ = 'America/New_York'
+SESSION_TTL = 30   # 這麼多秒沒有心跳的 session 視為已離開 (瀏覽器分頁關掉不會通知伺服器)
+
+
+def trading_day(ts):
+    """成交時間 -> 美東交易日 (日 K 以美東日期切分)"""
+    ts = pd.Timestamp(ts)
+    if ts.tzinfo is None: ts = ts.tz_localize('UTC')
+    return ts.tz_convert(MARKET_TZ).date()
+
+
+class DailyBarAggregator:
+    """把逐筆成交 (或分 K) 累積成「當日」日 K：新交易日開一根新的，同一天就改寫最後一根"""
+
+    def __init__(self):
+        self.bars = {}  # symbol -> dict(day, open, high, low, close, volume)
+
+    def seed(self, symbol, day, bar):
+        self.bars[symbol] = {'day': day, **{k: float(bar[k]) for k in ('open', 'high', 'low', 'close', 'volume')}}
+
+    def add(self, symbol, price, size, ts):
+        """回傳 (當日 K 線, 是否為新的一根)"""
+        day = trading_day(ts)
+        bar = self.bars.get(symbol)
+        if bar is None or day > bar['day']:
+            bar = {'day': day, 'open': price, 'high': price, 'low': price, 'close': price, 'volume': float(size)}
+            self.bars[symbol] = bar
+            return bar, True
+        if day < bar['day']:
+            return bar, False  # 延遲到達的舊資料，忽略
+        bar['high'] = max(bar['high'], price)
+        bar['low'] = min(bar['low'], price)
+        bar['close'] = price
+        bar['volume'] += size
+        return bar, False
+
+
+class LiveSignalService:
+    """
+    串流模式核心：歷史 K 線只在啟動時載入一次，之後每筆成交
+    -> 聚合成當日 K -> O(1) 更新 SMA / RSI -> 重新判斷信號，信號改變時通知訂閱者。
+    signal_fn(df, symbol) 與 trading.get_signal 相同介面。
+    """
+
+    def __init__(self, signal_fn, sma_windows=indicators.DEFAULT_SMA_WINDOWS):
+        self.signal_fn = signal_fn
+        self.engine = indicators.IndicatorEngine(sma_windows)
+        self.aggregator = DailyBarAggregator()
+        self.latest = {}  # symbol -> dict(指標 + signal / color / updated_at)
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._dropped = set()
+        self.events = 0
+
+    def subscribe(self, callback):
+        """callback(symbol, signal, color, snapshot)：只在信號改變時呼叫"""
+        self._subscribers.append(callback)
+
+    def seed(self, symbol, df):
+        """用 get_market_data 的歷史 K 線初始化該標的 (最後一根視為當日 K)"""
+        if df.empty: return
+        with self._lock:
+            self._dropped.discard(symbol)
+            self.engine.seed(symbol, df['close'].to_numpy())
+            self.aggregator.seed(symbol, trading_day(df.index[-1]), df.iloc[-1])
+            self._evaluate(symbol, df.index[-1])
+
+    def on_trade(self, symbol, price, size, ts):
+        """處理一筆成交 (串流來源的 callback)"""
+        with self._lock:
+            if symbol in self._dropped: return  # 已退訂，延遲到達的成交不再處理
+            self.events += 1
+            bar, is_new = self.aggregator.add(symbol, float(price), float(size), ts)
+            self.engine.update(symbol, bar['close'], replace=not is_new)
+            changed = self._evaluate(symbol, ts)
+        if changed:
+            snap = self.latest[symbol]
+            for cb in self._subscribers:
+                try: cb(symbol, snap['signal'], snap['color'], snap)
+                except Exception: pass
+
+    def _evaluate(self, symbol, ts):
+        snap = self.engine.snapshot(symbol)
+        signal, color = self.signal_fn(pd.DataFrame([snap]), symbol)
+        prev = self.latest.get(symbol)
+        self.latest[symbol] = {**snap, 'signal': signal, 'color': color, 'updated_at': pd.Timestamp(ts)}
+        return prev is not None and prev['signal'] != signal
+
+    def drop(self, symbols):
+        """沒有人訂閱的標的：清掉狀態，之後的成交忽略"""
+        with self._lock:
+            for sym in symbols:
+                self._dropped.add(sym)
+                self.latest.pop(sym, None)
+                self.aggregator.bars.pop(sym, None)
+                self.engine.drop(sym)
+
+    def table(self, symbols=None):
+        """給 UI 用的即時信號表；symbols 只取這幾檔 (各 session 自己的清單)"""
+        with self._lock:
+            rows = [{'Sym': sym, **snap} for sym, snap in self.latest.items() if symbols is None or sym in symbols]
+        return pd.DataFrame(rows)
+
+
+class LiveHub:
+    """
+    整個程式共用一個即時服務與一條串流 (Alpaca 每個帳戶能開的資料連線有限)。
+    各 session 用 acquire(session_id, symbols) 登記自己要看的標的 (同時當心跳)，release 時退訂；
+    串流實際訂閱的是所有 session 的聯集，最後一個 session 離開 (或心跳逾時) 就把串流停掉。
+    make_source() 產生新的資料來源，load(symbols) 回傳 {symbol: 歷史日 K}。
+    """
+
+    def __init__(self, signal_fn, make_source, load, session_ttl=SESSION_TTL):
+        self.service = LiveSignalService(signal_fn)
+        self.make_source = make_source
+        self.load = load
+        self.session_ttl = session_ttl
+        self.source = None
+        self.active = set()
+        self._sessions = {}  # session_id -> (symbols, 最後心跳時間)
+        self._lock = threading.RLock()
+        self._reaper = None
+
+    def acquire(self, session_id, symbols):
+        symbols = frozenset(symbols)
+        with self._lock:
+            prev = self._sessions.get(session_id)
+            self._sessions[session_id] = (symbols, time.monotonic())
+            if prev is None or prev[0] != symbols: self._reconcile()
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_loop, daemon=True)
+                self._reaper.start()
+        return self.service
+
+    def release(self, session_id):
+        with self._lock:
+            if self._sessions.pop(session_id, None) is not None: self._reconcile()
+
+    def reap(self, now=None):
+        """移除心跳逾時的 session (分頁已關)"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = [sid for sid, (_, seen) in self._sessions.items() if now - seen > self.session_ttl]
+            for sid in expired: del self._sessions[sid]
+            if expired: self._reconcile()
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(self.session_ttl / 2)
+            try: self.reap()
+            except Exception: pass
+
+    def _reconcile(self):
+        needed = set().union(*(syms for syms, _ in self._sessions.values()))
+        added, removed = sorted(needed - self.active), sorted(self.active - needed)
+        if removed:
+            if self.source is not None and needed: self.source.remove(removed)
+            self.service.drop(removed)
+        if not needed:
+            if self.source is not None: self.source.stop()
+            self.source = None
+        elif added:
+            if self.source is None: self.source = self.make_source()
+            data = self.source.prepare(self.load(added))
+            for sym, df in data.items(): self.service.seed(sym, df)
+            self.source.add(self.service, added)
+        self.active = needed
+
+    def subscribers(self):
+        with self._lock:
+            return len(self._sessions)
+
+
+# ========================================================
+# 資料來源：Alpaca 即時串流 / 本機回放 (離線測試用)
+# ========================================================
+class AlpacaTradeSource:
+    """訂閱 Alpaca 即時成交 (在背景執行緒跑 asyncio 串流)"""
+
+    def __init__(self, key_id, secret_key, base_url, feed='iex'):
+        from alpaca_trade_api.stream import Stream
+        self.stream = Stream(key_id, secret_key, base_url=base_url, data_feed=feed)
+        self._thread = None
+
+    def prepare(self, data):
+        return data
+
+    def add(self, service, symbols):
+        """加訂標的；串流還沒跑就啟動 (已在跑時 Stream 會在同一條連線上送出 subscribe)"""
+        async def handler(trade):
+            service.on_trade(trade.symbol, trade.price, trade.size, trade.timestamp)
+
+        self.stream.subscribe_trades(handler, *symbols)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.stream.run, daemon=True)
+            self._thread.start()
+
+    start = add
+
+    def remove(self, symbols):
+        self.stream.unsubscribe_trades(*symbols)
+
+    def stop(self):
+        self.stream.stop()
+
+
+class ReplaySource:
+    """
+    本機回放：把事先準備好的成交事件 (symbol, price, size, ts) 依序送進服務，
+    speed 秒 / 筆 (0 代表全速)。不需要網路與 API Key，方便離線測試串流流程。
+    prepare(data) 會把新標的最近幾天拆成回放事件接在後面 (介面與 AlpacaTradeSource 相同)。
+    """
+
+    def __init__(self, events=(), speed=0.2):
+        self.events = deque(events)
+        self.speed = speed
+        self.wanted = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def prepare(self, data):
+        seed_data, events = replay_events_from_bars(data)
+        self.events.extend(events)
+        return seed_data
+
+    def add(self, service, symbols=None):
+        if symbols: self.wanted = (self.wanted or set()) | set(symbols)
+        if self._thread is not None: return
+
+        def run():
+            while not self._stop.is_set():
+                try: sym, price, size, ts = self.events.popleft()
+                except IndexError:
+                    self._stop.wait(0.5)
+                    continue
+                if self.wanted is None or sym in self.wanted:
+                    service.on_trade(sym, price, size, ts)
+                if self.speed: self._stop.wait(self.speed)
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+
+    start = add
+
+    def remove(self, symbols):
+        if self.wanted is not None: self.wanted = self.wanted - set(symbols)
+
+    def stop(self):
+        self._stop.set()
+
+
+def replay_events_from_bars(data, days=5):
+    """
+    把最近 days 根日 K 拆成盤中成交 (開 -> 高 -> 低 -> 收)，依時間排序，供 ReplaySource 使用。
+    回傳 (seed_data, events)：seed_data 為扣掉這幾天的歷史 (拿去 seed)，events 為回放事件。
+    """
+    seed_data, events = {}, []
+    for sym, df in data.items():
+        if df.empty: continue
+        seed_data[sym] = df.iloc[:-days] if len(df) > days else df.iloc[:0]
+        for ts, row in df.tail(days).iterrows():
+            session_open = pd.Timestamp(trading_day(ts)).tz_localize(MARKET_TZ) + pd.Timedelta(hours=9, minutes=30)
+            vol = float(row['volume']) / 4
+            for k, price in enumerate((row['open'], row['high'], row['low'], row['close'])):
+                events.append((sym, float(price), vol, session_open + pd.Timedelta(hours=2 * k)))
+    events.sort(key=lambda e: e[3])
+    return seed_data, events
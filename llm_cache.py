@@ -0,0 +1,106 @@
+# llm_cache.py
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# Gemini 分析結果的本機快取 (SQLite)：重啟、多個使用者、多個副本都共用同一份
+DB_FILE = os.environ.get('GEMINI_CACHE_FILE', 'gemini_cache.sqlite')
+TTL_SECONDS = int(os.environ.get('GEMINI_CACHE_TTL', 6 * 3600))
+MAX_BYTES = int(float(os.environ.get('GEMINI_CACHE_MAX_MB', 20)) * 1024 * 1024)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    key TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL,
+    size INTEGER NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_access ON analyses (last_access);
+"""
+
+_lock = threading.Lock()
+
+
+def connect(path=None):
+    conn = sqlite3.connect(path or DB_FILE, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def normalize_headlines(headlines):
+    """標題正規化：去頭尾空白、轉小寫、壓縮空白，去重後排序 (順序不同的同一批新聞視為相同)"""
+    return sorted({re.sub(r'\s+', ' ', h).strip().lower() for h in headlines if h and h.strip()})
+
+
+def make_key(symbol, headlines, trend, rsi, lang, prompt_version):
+    """內容定址的 key：sha256(symbol, 正規化標題集合, 趨勢, 四捨五入 RSI, 語言, prompt 版本)"""
+    material = json.dumps({
+        'symbol': symbol.upper(),
+        'headlines': normalize_headlines(headlines),
+        'trend': trend,
+        'rsi': int(round(float(rsi))),
+        'lang': lang,
+        'prompt': prompt_version,
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def get(key, ttl=None):
+    """命中且未過期時回傳快取的文字，否則回傳 None"""
+    ttl = TTL_SECONDS if ttl is None else ttl
+    now = time.time()
+    with _lock:
+        conn = connect()
+        try:
+            row = conn.execute("SELECT created, value FROM analyses WHERE key=?", (key,)).fetchone()
+            if row is None: return None
+            if now - row[0] > ttl:
+                conn.execute("DELETE FROM analyses WHERE key=?", (key,))
+                conn.commit()
+                return None
+            conn.execute("UPDATE analyses SET last_access=? WHERE key=?", (now, key))
+            conn.commit()
+            return row[1]
+        finally:
+            conn.close()
+
+
+def put(key, value, max_bytes=None):
+    """寫入快取；總大小超過上限時，從最久沒被讀取的開始淘汰"""
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    now = time.time()
+    size = len(value.encode('utf-8'))
+    with _lock:
+        conn = connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO analyses (key, created, last_access, size, value) VALUES (?, ?, ?, ?, ?)",
+                (key, now, now, size, value)
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM analyses").fetchone()[0]
+            if total > max_bytes:
+                for old_key, old_size in conn.execute("SELECT key, size FROM analyses ORDER BY last_access").fetchall():
+                    if total <= max_bytes: break
+                    if old_key == key: continue
+                    conn.execute("DELETE FROM analyses WHERE key=?", (old_key,))
+                    total -= old_size
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def purge_expired(ttl=None):
+    ttl = TTL_SECONDS if ttl is None else ttl
+    with _lock:
+        conn = connect()
+        try:
+            conn.execute("DELETE FROM analyses WHERE created < ?", (time.time() - ttl,))
+            conn.commit()
+        finally:
+            conn.close()
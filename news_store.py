@@ -0,0 +1,185 @@
+# news_store.py
+import os
+import re
+import sqlite3
+import threading
+import time
+import pandas as pd
+
+# 本機新聞庫 (SQLite)：以文章 id 去重，同一篇多檔共用；整份清單批次、依時間增量抓取
+DB_FILE = os.environ.get('NEWS_STORE_FILE', 'news.sqlite')
+REFRESH_SEC = 300          # 同一檔多久內不再向 API 補抓
+LOOKBACK_DAYS = 7          # 第一次抓取往回看幾天
+OVERLAP_SEC = 600          # 增量抓取往前重疊一點，補上較晚才被索引的文章
+FETCH_PER_SYMBOL = 20      # 每批請求的 limit = 檔數 × 這個數
+MAX_PAGES = 20             # 一批最多往回翻幾頁；翻不完就不推進同步時間，下次再補
+DUP_THRESHOLD = 0.8        # 標題字詞 Jaccard 相似度超過此值視為重複
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id TEXT PRIMARY KEY,
+    headline TEXT NOT NULL,
+    summary TEXT,
+    source TEXT,
+    url TEXT,
+    created_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS article_symbols (
+    symbol TEXT NOT NULL,
+    id TEXT NOT NULL,
+    created_at INTEGER NOT NULL,
+    PRIMARY KEY (symbol, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_article_symbols_time ON article_symbols (symbol, created_at);
+CREATE TABLE IF NOT EXISTS sync (
+    symbol TEXT PRIMARY KEY,
+    synced_until REAL NOT NULL
+);
+"""
+
+_lock = threading.Lock()
+
+
+def connect(path=None):
+    conn = sqlite3.connect(path or DB_FILE, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _ts(value):
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None: ts = ts.tz_localize('UTC')
+    return int(ts.timestamp())
+
+
+def _iso(ts):
+    return pd.Timestamp(ts, unit='s', tz='UTC').strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _tokens(headline):
+    return frozenset(re.findall(r'[a-z0-9]+', headline.lower()))
+
+
+def is_near_duplicate(a, b, threshold=DUP_THRESHOLD):
+    if not a or not b: return a == b
+    return len(a & b) / len(a | b) >= threshold
+
+
+def dedupe(articles, threshold=DUP_THRESHOLD):
+    """依序保留文章，標題與已保留者太像的就丟掉 (輸入應為新到舊，因此保留最新的那篇)"""
+    kept, seen = [], []
+    for a in articles:
+        tok = _tokens(a['headline'])
+        if any(is_near_duplicate(tok, s, threshold) for s in seen): continue
+        kept.append(a)
+        seen.append(tok)
+    return kept
+
+
+def save_articles(conn, raw_news):
+    """寫入 Alpaca 新聞物件 (同一 id 只存一份)，並建立 symbol -> 文章索引；回傳寫入筆數"""
+    rows, links = [], []
+    for n in raw_news:
+        art_id = str(getattr(n, 'id', '') or getattr(n, 'url', ''))
+        if not art_id: continue
+        created = _ts(n.created_at)
+        rows.append((art_id, n.headline, getattr(n, 'summary', ''), getattr(n, 'source', ''), getattr(n, 'url', ''), created))
+        links.extend((sym.upper(), art_id, created) for sym in (getattr(n, 'symbols', None) or []))
+    conn.executemany("INSERT OR REPLACE INTO articles (id, headline, summary, source, url, created_at) VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.executemany("INSERT OR IGNORE INTO article_symbols (symbol, id, created_at) VALUES (?, ?, ?)", links)
+    return len(rows)
+
+
+def stale_symbols(conn, symbols, now=None, refresh_sec=REFRESH_SEC):
+    """回傳 {symbol: 上次抓到的時間 (None 表示從沒抓過)}，只含需要補抓的"""
+    now = time.time() if now is None else now
+    synced = dict(conn.execute(
+        f"SELECT symbol, synced_until FROM sync WHERE symbol IN ({', '.join('?' * len(symbols))})", symbols
+    ).fetchall()) if symbols else {}
+    return {s: synced.get(s) for s in symbols if synced.get(s) is None or now - synced[s] >= refresh_sec}
+
+
+def sync(fetch_many, symbols, chunk_size=20, refresh_sec=REFRESH_SEC):
+    """
+    增量更新多檔新聞：只處理超過 refresh_sec 沒更新的標的，每 chunk_size 檔合併成一次請求，
+    從該批最早的同步時間 (減去重疊) 開始抓。結果 (新到舊) 被 limit 截斷時，以最舊一篇的時間當 end 往回翻頁，
+    整段區間都抓齊才推進該批的同步時間。
+    fetch_many(symbols, start_iso, limit, end_iso) 回傳 Alpaca 新聞物件 list。回傳實際發出的請求數。
+    """
+    symbols = sorted({s.upper() for s in symbols if s})
+    now = time.time()
+    with _lock:
+        conn = connect()
+        try:
+            stale = stale_symbols(conn, symbols, now, refresh_sec)
+        finally:
+            conn.close()
+    if not stale: return 0
+
+    default_start = now - LOOKBACK_DAYS * 86400
+    pending = sorted(stale)
+    requests = 0
+    for i in range(0, len(pending), chunk_size):
+        chunk = pending[i:i + chunk_size]
+        start = min((stale[s] - OVERLAP_SEC) if stale[s] else default_start for s in chunk)
+        start_iso = _iso(start)
+        limit = FETCH_PER_SYMBOL * len(chunk)
+        end_iso, seen, complete = None, set(), False
+        for _ in range(MAX_PAGES):
+            try:
+                raw = list(fetch_many(chunk, start_iso, limit, end_iso))
+                requests += 1
+            except Exception:
+                break  # 這批失敗：不推進同步時間，下次再抓
+            ids = {str(getattr(n, 'id', '') or getattr(n, 'url', '')) for n in raw}
+            with _lock:
+                conn = connect()
+                try:
+                    save_articles(conn, raw)
+                    conn.commit()
+                finally:
+                    conn.close()
+            if len(raw) < limit or ids <= seen:
+                complete = True
+                break
+            seen |= ids
+            end_iso = _iso(min(_ts(n.created_at) for n in raw) + 1)  # 多退 1 秒，同一秒的文章靠 id 去重
+        if not complete: continue
+        with _lock:
+            conn = connect()
+            try:
+                conn.executemany("INSERT OR REPLACE INTO sync (symbol, synced_until) VALUES (?, ?)", [(s, now) for s in chunk])
+                conn.commit()
+            finally:
+                conn.close()
+    return requests
+
+
+def get_news(symbol, limit=8, dedup=True):
+    """讀出某檔最新新聞 (新到舊)，格式與 trading.get_stock_news 相同"""
+    with _lock:
+        conn = connect()
+        try:
+            rows = conn.execute(
+                "SELECT a.headline, a.summary, a.source, a.url, a.created_at FROM article_symbols s "
+                "JOIN articles a ON a.id = s.id WHERE s.symbol=? ORDER BY s.created_at DESC LIMIT ?",
+                (symbol.upper(), limit * 3 if dedup else limit)
+            ).fetchall()
+        finally:
+            conn.close()
+    news = [{'headline': h, 'summary': sm, 'source': src, 'url': url, 'created_at': pd.Timestamp(ts, unit='s', tz='UTC')}
+            for h, sm, src, url, ts in rows]
+    return (dedupe(news) if dedup else news)[:limit]
+
+
+def purge_older_than(days=30):
+    cutoff = time.time() - days * 86400
+    with _lock:
+        conn = connect()
+        try:
+            conn.execute("DELETE FROM article_symbols WHERE created_at < ?", (cutoff,))
+            conn.execute("DELETE FROM articles WHERE created_at < ?", (cutoff,))
+            conn.commit()
+        finally:
+            conn.close()
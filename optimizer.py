@@ -0,0 +1,111 @@
+# optimizer.py
+import os
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import backtest
+
+# 組合數少於這個值就直接在主程序跑 (開 Process Pool 的成本比回測本身還貴)
+MIN_PARALLEL_COMBOS = 200
+CHUNK_SIZE = 64
+
+RESULT_COLUMNS = ['sma_short', 'sma_long', 'rsi_buy_max', 'stop_loss_pct',
+                  'total_return', 'max_drawdown', 'num_trades', 'win_rate', 'final_value']
+
+# 每個 worker 程序自己的狀態 (共享記憶體 + 已算過的 SMA)
+_worker = {}
+
+
+def grid_params(sma_short_values, sma_long_values, rsi_values, stop_values):
+    """網格搜尋：列出所有組合 (短均線必須小於長均線)"""
+    return [
+        (int(s), int(l), float(r), float(sl))
+        for s, l, r, sl in itertools.product(sma_short_values, sma_long_values, rsi_values, stop_values)
+        if s < l
+    ]
+
+
+def random_params(n, sma_short_range, sma_long_range, rsi_range, stop_range, seed=None):
+    """隨機搜尋：在 (min, max) 範圍內抽 n 組不重複的參數 (短均線必須小於長均線)"""
+    rng = np.random.default_rng(seed)
+    combos = set()
+    for _ in range(n * 10):
+        if len(combos) >= n: break
+        s = int(rng.integers(sma_short_range[0], sma_short_range[1] + 1))
+        l = int(rng.integers(sma_long_range[0], sma_long_range[1] + 1))
+        if s >= l: continue
+        r = float(rng.integers(rsi_range[0], rsi_range[1] + 1))
+        sl = round(float(rng.uniform(stop_range[0], stop_range[1])), 3)
+        combos.add((s, l, r, sl))
+    return sorted(combos)
+
+
+def _load(close, rsi, shm=None):
+    _worker.clear()
+    _worker.update(shm=shm, close=close, rsi=rsi, sma={})
+
+
+def _attach(shm_name, n):
+    """Worker 初始化：掛上主程序建立的共享記憶體 (close / RSI)，不需每個任務 pickle 一次資料"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    arr = np.ndarray((2, n), dtype=np.float64, buffer=shm.buf)
+    _load(arr[0], arr[1], shm)
+
+
+def _sma(window):
+    # 同一個 worker 內，相同視窗的 SMA 只算一次
+    cache = _worker['sma']
+    if window not in cache:
+        cache[window] = pd.Series(_worker['close']).rolling(window=window).mean().to_numpy()
+    return cache[window]
+
+
+def _eval_chunk(chunk, initial_capital):
+    close, rsi = _worker['close'], _worker['rsi']
+    rows = []
+    for sma_short, sma_long, rsi_buy_max, stop_loss_pct in chunk:
+        start_idx = max(sma_long, 50)
+        equity, trades = backtest.simulate(close, _sma(sma_short), _sma(sma_long), rsi,
+                                           start_idx, initial_capital, rsi_buy_max, stop_loss_pct)
+        stats = backtest.summarize(equity, trades, initial_capital, close, start_idx)
+        if not stats: continue
+        rows.append((sma_short, sma_long, rsi_buy_max, stop_loss_pct, stats['total_return'],
+                     stats['max_drawdown'], stats['num_trades'], stats['win_rate'], stats['final_value']))
+    return rows
+
+
+def run_sweep(df, params, initial_capital=10000, max_workers=None):
+    """
+    對同一檔標的跑大量參數組合，回傳依報酬率排序的 DataFrame。
+    K 線只放進共享記憶體一次，所有 worker 直接讀取；任務以 CHUNK_SIZE 組一包分派。
+    """
+    if df.empty or not params:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+
+    close = df['close'].to_numpy(dtype=float)
+    rsi = df['RSI'].to_numpy(dtype=float)
+    chunks = [params[i:i + CHUNK_SIZE] for i in range(0, len(params), CHUNK_SIZE)]
+
+    if len(params) < MIN_PARALLEL_COMBOS:
+        _load(close, rsi)
+        try:
+            results = [_eval_chunk(c, initial_capital) for c in chunks]
+        finally:
+            _worker.clear()
+    else:
+        data = np.vstack([close, rsi])
+        shm = shared_memory.SharedMemory(create=True, size=data.nbytes)
+        try:
+            np.ndarray(data.shape, dtype=np.float64, buffer=shm.buf)[:] = data
+            workers = max_workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(shm.name, len(close))) as pool:
+                results = list(pool.map(_eval_chunk, chunks, itertools.repeat(initial_capital)))
+        finally:
+            shm.close()
+            shm.unlink()
+
+    rows = [row for chunk in results for row in chunk]
+    out = pd.DataFrame(rows, columns=RESULT_COLUMNS)
+    return out.sort_values('total_return', ascending=False).reset_index(drop=True)
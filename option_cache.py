@@ -0,0 +1,122 @@
+# option_cache.py
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+import yfinance as yf
+
+# 期權鏈快取：以 (標的, 到期日) 為 key，短 TTL；選了某個到期日後，背景預先抓接下來幾個到期日。
+# 使用者正在等的那一條在呼叫端執行緒自己抓，不跟預抓搶 Thread Pool
+CHAIN_TTL = 120            # 秒
+EXPIRATIONS_TTL = 600      # 秒
+PREFETCH_COUNT = 3
+PREFETCH_WORKERS = 3
+
+OptionChain = namedtuple('OptionChain', ['calls', 'puts'])
+
+
+def _yf_expirations(symbol):
+    return tuple(yf.Ticker(symbol).options)
+
+
+def _yf_chain(symbol, expiration):
+    opt = yf.Ticker(symbol).option_chain(expiration)
+    return OptionChain(opt.calls, opt.puts)
+
+
+class OptionChainCache:
+    """
+    執行緒安全的 TTL 快取。同一個 key 正在抓取時，其他呼叫者等同一個 Future，不會重複下載。
+    回傳的 DataFrame 都是複本，呼叫端可以放心加欄位。
+    """
+
+    def __init__(self, load_expirations=_yf_expirations, load_chain=_yf_chain,
+                 ttl=CHAIN_TTL, expirations_ttl=EXPIRATIONS_TTL, max_workers=PREFETCH_WORKERS):
+        self.load_expirations = load_expirations
+        self.load_chain = load_chain
+        self.ttl = ttl
+        self.expirations_ttl = expirations_ttl
+        self._chains = {}      # (symbol, expiration) -> (fetched_at, OptionChain)
+        self._exps = {}        # symbol -> (fetched_at, tuple)
+        self._inflight = {}    # (symbol, expiration) -> Future
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='option-prefetch')
+        self.hits = 0
+        self.misses = 0
+
+    def expirations(self, symbol):
+        now = time.monotonic()
+        with self._lock:
+            hit = self._exps.get(symbol)
+            if hit and now - hit[0] < self.expirations_ttl: return hit[1]
+        exps = tuple(self.load_expirations(symbol))
+        with self._lock:
+            self._exps[symbol] = (time.monotonic(), exps)
+        return exps
+
+    def _fresh(self, key, now):
+        hit = self._chains.get(key)
+        return hit[1] if hit and now - hit[0] < self.ttl else None
+
+    def _load(self, key):
+        try:
+            chain = self.load_chain(*key)
+            with self._lock:
+                self._chains[key] = (time.monotonic(), chain)
+            return chain
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _future(self, key):
+        """回傳 (快取中的資料, None) 或 (None, 正在抓取的 Future)；必須在持有 lock 時呼叫"""
+        chain = self._fresh(key, time.monotonic())
+        if chain is not None: return chain, None
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = self._pool.submit(self._load, key)
+            self._inflight[key] = fut
+        return None, fut
+
+    def _run(self, key, fut):
+        try: fut.set_result(self._load(key))
+        except Exception as e: fut.set_exception(e)
+
+    def chain(self, symbol, expiration, use_pool=False):
+        """
+        取一條期權鏈。快取沒有時直接在呼叫端執行緒下載，不排在預抓後面；
+        同一條的預抓若還在排隊就取消，已經在下載則等它。use_pool=True (批次掃描) 則交給 Thread Pool。
+        """
+        key = (symbol, expiration)
+        own = None
+        with self._lock:
+            if use_pool:
+                chain, fut = self._future(key)
+            else:
+                chain, fut = self._fresh(key, time.monotonic()), self._inflight.get(key)
+                if chain is None and (fut is None or fut.cancel()):
+                    fut = own = self._inflight[key] = Future()
+            if chain is not None: self.hits += 1
+            else: self.misses += 1
+        if own is not None: self._run(key, own)
+        if chain is None: chain = fut.result()
+        return OptionChain(chain.calls.copy(), chain.puts.copy())
+
+    def prefetch(self, symbol, expirations):
+        """背景預抓 (不等待)；已在快取或正在抓的直接略過"""
+        with self._lock:
+            for exp in expirations: self._future((symbol, exp))
+
+    def prefetch_after(self, symbol, expirations, current, count=PREFETCH_COUNT):
+        """預抓 current 之後的 count 個到期日"""
+        exps = list(expirations)
+        start = exps.index(current) + 1 if current in exps else 0
+        self.prefetch(symbol, exps[start:start + count])
+
+    def clear(self):
+        with self._lock:
+            self._chains.clear()
+            self._exps.clear()
+
+
+chain_cache = OptionChainCache()
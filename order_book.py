@@ -0,0 +1,182 @@
+# order_book.py
+import threading
+import time
+import pandas as pd
+from order_tracker import order_dict
+
+# 本機鏡像的掛單 / 持倉簿：啟動時抓一次，之後靠 trade_updates 事件即時更新，
+# 沒有串流時以短 TTL 重新同步。各頁面與下單流程都從記憶體讀，不再各自打 list_orders
+ORDERS_TTL = 10            # 沒有串流時，掛單多久重新同步一次 (秒)
+STREAM_RESYNC = 120        # 有串流時的保險性全量同步間隔 (秒)
+POSITIONS_TTL = 10
+OPEN_STATUSES = {'new', 'accepted', 'pending_new', 'partially_filled', 'held', 'accepted_for_bidding',
+                 'pending_cancel', 'pending_replace', 'calculated'}
+OPEN_ORDER_LIMIT = 500     # list_orders 單頁上限，超過就用 until 游標往下翻
+MAX_CLOSED = 1000          # 已結束的訂單最多留幾筆在記憶體
+MAX_STATUS_REFRESH = 20    # 每次同步最多個別補查幾筆「消失的掛單」的實際狀態
+
+
+def list_all_open(list_orders, page_limit=OPEN_ORDER_LIMIT):
+    """
+    翻完目前所有掛單 (until 游標由新到舊，游標多退 1 微秒再以 id 去重)。
+    只抓一頁的話，超過上限的掛單會被當成不存在，下單前的重複檢查就會漏掉。
+    """
+    orders, seen, until = [], set(), None
+    while True:
+        kwargs = {'status': 'open', 'limit': page_limit, 'direction': 'desc', 'nested': True}
+        if until: kwargs['until'] = until
+        page = list(list_orders(**kwargs))
+        fresh = [o for o in page if str(order_dict(o).get('id')) not in seen]
+        orders.extend(fresh)
+        seen |= {str(order_dict(o).get('id')) for o in fresh}
+        times = [order_dict(o).get('created_at') for o in page]
+        if len(page) < page_limit or not fresh or not all(times): break
+        until = (min(pd.Timestamp(t) for t in times) + pd.Timedelta(microseconds=1)).isoformat()
+    return orders
+
+
+class OrderView(dict):
+    """dict 也能用屬性讀取 (o.symbol)，讓 REST 物件與串流事件長得一樣"""
+
+    def __getattr__(self, name):
+        try: return self[name]
+        except KeyError: raise AttributeError(name)
+
+
+class OrderBook:
+    """
+    掛單以 id 存放，另有 symbol -> ids、status -> ids 兩個索引。
+    讀取時若超過 TTL 才重新同步 (有串流時 TTL 拉長，只當保險)。
+    """
+
+    def __init__(self, api, orders_ttl=ORDERS_TTL, positions_ttl=POSITIONS_TTL):
+        self.api = api
+        self.orders_ttl = orders_ttl
+        self.positions_ttl = positions_ttl
+        self._tracker = None
+        self._orders = {}
+        self._by_symbol = {}
+        self._by_status = {}
+        self._positions = []
+        self._orders_at = 0.0
+        self._positions_at = 0.0
+        self.generation = 0        # 持倉被判定過期 (成交 / invalidate) 的次數，外部抓的持倉靠它判斷是否已經過時
+        self._lock = threading.RLock()
+
+    # ---------- 寫入 ----------
+    def _unindex(self, order_id):
+        old = self._orders.pop(order_id, None)
+        if old is None: return
+        self._by_symbol.get(old.symbol, set()).discard(order_id)
+        self._by_status.get(old.status, set()).discard(order_id)
+
+    def _upsert(self, order):
+        o = OrderView(order_dict(order))
+        o['id'] = str(o.get('id'))
+        self._unindex(o['id'])
+        self._orders[o['id']] = o
+        self._by_symbol.setdefault(o.get('symbol'), set()).add(o['id'])
+        self._by_status.setdefault(o.get('status'), set()).add(o['id'])
+        return o
+
+    def record(self, order):
+        """自己剛送出 / 剛改動的訂單立刻寫入，不必等下一次同步"""
+        with self._lock:
+            return self._upsert(order)
+
+    def on_update(self, event, order):
+        """接 order_tracker 的事件 (OrderTracker.subscribe)"""
+        with self._lock:
+            self._upsert(order)
+            if event in ('fill', 'partial_fill'):  # 持倉變了，下次讀取時重抓
+                self._positions_at = 0.0
+                self.generation += 1
+
+    def attach(self, tracker):
+        """訂閱 trade_updates 事件；串流確實有送事件進來時，之後只做低頻的保險同步"""
+        tracker.subscribe(self.on_update)
+        self._tracker = tracker
+
+    @property
+    def streaming(self):
+        """看 tracker 最近有沒有實際收到串流事件，串流掛掉時自動退回短 TTL"""
+        return self._tracker is not None and self._tracker.streaming
+
+    def invalidate(self):
+        with self._lock:
+            self._orders_at = 0.0
+            self._positions_at = 0.0
+            self.generation += 1
+
+    # ---------- 同步 ----------
+    def sync_orders(self, force=False):
+        ttl = STREAM_RESYNC if self.streaming else self.orders_ttl
+        with self._lock:
+            if not force and time.monotonic() - self._orders_at < ttl: return
+            fresh = list_all_open(self.api.list_orders)
+            fresh_ids = set()
+            for o in fresh: fresh_ids.add(self._upsert(o)['id'])
+            # 不在最新掛單清單裡、但本機還以為是掛單的：已經結束，個別補查實際狀態，查不到就移除
+            gone = list(self._open_ids() - fresh_ids)
+            for i, order_id in enumerate(gone):
+                try:
+                    if i >= MAX_STATUS_REFRESH: raise LookupError(order_id)
+                    self._upsert(self.api.get_order(order_id))
+                except Exception:
+                    self._unindex(order_id)
+            closed = [i for i in self._orders if i not in fresh_ids]
+            for order_id in closed[:max(0, len(closed) - MAX_CLOSED)]: self._unindex(order_id)
+            self._orders_at = time.monotonic()
+
+    def sync_positions(self, force=False):
+        with self._lock:
+            if not force and time.monotonic() - self._positions_at < self.positions_ttl: return
+            self._positions = list(self.api.list_positions())
+            self._positions_at = time.monotonic()
+
+    def set_positions(self, positions, generation=None):
+        """
+        外部剛抓到的持倉 (例如帳戶快照) 直接寫入，重設 TTL。
+        generation 為開始抓取前的 self.generation；抓取期間有成交或 invalidate 時丟棄，回傳 False。
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation: return False
+            self._positions = list(positions)
+            self._positions_at = time.monotonic()
+            return True
+
+    # ---------- 讀取 ----------
+    def _open_ids(self):
+        ids = set()
+        for status in OPEN_STATUSES: ids |= self._by_status.get(status, set())
+        return ids
+
+    def open_orders(self, symbol=None):
+        self.sync_orders()
+        with self._lock:
+            ids = self._open_ids()
+            if symbol is not None: ids &= self._by_symbol.get(symbol, set())
+            return sorted((self._orders[i] for i in ids), key=lambda o: str(o.get('created_at') or ''), reverse=True)
+
+    def orders_by_status(self, status):
+        self.sync_orders()
+        with self._lock:
+            return [self._orders[i] for i in self._by_status.get(status, ())]
+
+    def has_open(self, symbol):
+        return bool(self.open_orders(symbol))
+
+    def open_index(self):
+        """與 trading.build_open_order_index 相同格式：{symbol: {side: [order, ...]}}"""
+        index = {}
+        for o in self.open_orders():
+            index.setdefault(o.symbol, {}).setdefault(o.side, []).append(o)
+        return index
+
+    def positions(self):
+        self.sync_positions()
+        with self._lock:
+            return list(self._positions)
+
+    def position_qty(self):
+        return {p.symbol: int(p.qty) for p in self.positions()}
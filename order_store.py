@@ -0,0 +1,255 @@
+# order_store.py
+import os
+import sqlite3
+import threading
+import time
+import pandas as pd
+from order_tracker import order_dict
+from order_book import OPEN_STATUSES
+
+# 本機訂單歷史 (SQLite)：第一次用 until 游標往回翻完整歷史，之後只用 after 抓新的
+DB_FILE = os.environ.get('ORDER_STORE_FILE', 'orders.sqlite')
+PAGE_LIMIT = 500           # Alpaca list_orders 單頁上限
+MIN_SYNC_SEC = 30          # 多久內不重複同步
+OVERLAP_SEC = 60           # 增量抓取往前重疊，避免邊界漏單
+MAX_OPEN_REFRESH = 50      # 每次同步最多個別補查幾筆「本機以為還掛著」的單
+
+COLUMNS = ['id', 'client_order_id', 'symbol', 'side', 'qty', 'filled_qty', 'filled_avg_price',
+           'limit_price', 'status', 'type', 'time_in_force', 'created_at', 'filled_at', 'updated_at']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    id TEXT PRIMARY KEY,
+    client_order_id TEXT,
+    symbol TEXT,
+    side TEXT,
+    qty REAL,
+    filled_qty REAL,
+    filled_avg_price REAL,
+    limit_price REAL,
+    status TEXT,
+    type TEXT,
+    time_in_force TEXT,
+    created_at INTEGER,
+    filled_at INTEGER,
+    updated_at INTEGER,
+    is_open INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_orders_created ON orders (created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_open ON orders (is_open, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_symbol ON orders (symbol, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status, created_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_lock = threading.Lock()
+
+
+def connect(path=None):
+    conn = sqlite3.connect(path or DB_FILE, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _us(value):
+    """時間 (Timestamp / ISO 字串) -> UTC 微秒整數；沒有值回傳 None"""
+    if value is None or value == '': return None
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None: ts = ts.tz_localize('UTC')
+    return int(ts.value // 1000)
+
+
+def _iso(us):
+    return pd.Timestamp(us * 1000, tz='UTC').isoformat()
+
+
+def _num(value):
+    try: return float(value) if value not in (None, '') else None
+    except (TypeError, ValueError): return None
+
+
+def _meta(conn, key, default=None):
+    row = conn.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def _set_meta(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+
+def _rows(orders):
+    """攤平 (含 nested legs) 並轉成資料列"""
+    for o in orders:
+        d = order_dict(o)
+        yield (
+            str(d.get('id')), d.get('client_order_id'), d.get('symbol'), d.get('side'),
+            _num(d.get('qty')), _num(d.get('filled_qty')), _num(d.get('filled_avg_price')), _num(d.get('limit_price')),
+            d.get('status'), d.get('type') or d.get('order_type'), d.get('time_in_force'),
+            _us(d.get('created_at')), _us(d.get('filled_at')), _us(d.get('updated_at')),
+            int(d.get('status') in OPEN_STATUSES),
+        )
+        legs = d.get('legs') or []
+        if legs: yield from _rows(legs)
+
+
+def save_orders(conn, orders):
+    rows = list(_rows(orders))
+    conn.executemany(
+        f"INSERT OR REPLACE INTO orders ({', '.join(COLUMNS)}, is_open) VALUES ({', '.join('?' * (len(COLUMNS) + 1))})", rows
+    )
+    return rows
+
+
+def backfill(conn, list_orders, page_limit=PAGE_LIMIT):
+    """
+    用 until 游標由新到舊翻完整歷史 (可中斷續傳：游標存在 meta)。回傳請求次數。
+    until / after 為「不含」，游標多退 1 微秒再以 id 去重；整頁都是看過的單時停止，避免原地打轉。
+    """
+    requests = 0
+    cursor = _meta(conn, 'backfill_until')
+    seen = set()
+    while True:
+        kwargs = {'status': 'all', 'limit': page_limit, 'direction': 'desc', 'nested': True}
+        if cursor: kwargs['until'] = _iso(int(cursor))
+        page = list_orders(**kwargs)
+        requests += 1
+        rows = save_orders(conn, page)
+        ids = {r[0] for r in rows}
+        if rows:
+            cursor = min(r[11] for r in rows if r[11] is not None) + 1
+            _set_meta(conn, 'backfill_until', cursor)
+        conn.commit()
+        if len(page) < page_limit or not rows or ids <= seen: break
+        seen |= ids
+    _set_meta(conn, 'backfilled', 1)
+    conn.commit()
+    return requests
+
+
+def sync_new(conn, list_orders, get_order=None, page_limit=PAGE_LIMIT):
+    """增量同步：after 游標往後抓新單，再更新本機還標成掛單中的狀態。回傳請求次數。"""
+    requests = 0
+    newest = conn.execute("SELECT MAX(created_at) FROM orders").fetchone()[0]
+    cursor = (newest - OVERLAP_SEC * 1_000_000) if newest else None
+    seen = set()
+    while True:
+        kwargs = {'status': 'all', 'limit': page_limit, 'direction': 'asc', 'nested': True}
+        if cursor: kwargs['after'] = _iso(cursor)
+        page = list_orders(**kwargs)
+        requests += 1
+        rows = save_orders(conn, page)
+        conn.commit()
+        ids = {r[0] for r in rows}
+        if len(page) < page_limit or not rows or ids <= seen: break
+        seen |= ids
+        cursor = max(r[11] for r in rows if r[11] is not None) - 1
+
+    # 掛單的狀態會變 (成交 / 取消)：翻完目前所有掛單 (until 游標由新到舊)，本機以為還掛著但不在清單裡的再個別補查
+    open_ids, cursor = set(), None
+    while True:
+        kwargs = {'status': 'open', 'limit': page_limit, 'direction': 'desc', 'nested': True}
+        if cursor: kwargs['until'] = _iso(cursor)
+        page = list_orders(**kwargs)
+        requests += 1
+        rows = save_orders(conn, page)
+        ids = {r[0] for r in rows}
+        if len(page) < page_limit or not rows or ids <= open_ids:
+            open_ids |= ids
+            break
+        open_ids |= ids
+        cursor = min(r[11] for r in rows if r[11] is not None) + 1
+    stale = [r[0] for r in conn.execute("SELECT id FROM orders WHERE is_open=1").fetchall() if r[0] not in open_ids]
+    for order_id in stale[:MAX_OPEN_REFRESH]:
+        if get_order is None: break
+        try:
+            save_orders(conn, [get_order(order_id)])
+            requests += 1
+        except Exception: pass
+    conn.commit()
+    return requests
+
+
+def sync(list_orders, get_order=None, force=False, min_interval=MIN_SYNC_SEC):
+    """第一次先回補完整歷史，之後只做增量；min_interval 內重複呼叫直接略過。回傳請求次數"""
+    with _lock:
+        conn = connect()
+        try:
+            last = float(_meta(conn, 'last_sync', 0))
+            if not force and time.time() - last < min_interval: return 0
+            requests = 0
+            if not _meta(conn, 'backfilled'):
+                requests += backfill(conn, list_orders)
+            requests += sync_new(conn, list_orders, get_order)
+            _set_meta(conn, 'last_sync', time.time())
+            conn.commit()
+            return requests
+        finally:
+            conn.close()
+
+
+def _where(status=None, symbol=None, side=None):
+    clauses, params = [], []
+    if status == 'open': clauses.append("is_open=1")
+    elif status == 'closed': clauses.append("is_open=0")
+    elif status and status != 'all':
+        clauses.append("status=?")
+        params.append(status)
+    if symbol:
+        clauses.append("symbol=?")
+        params.append(symbol.upper())
+    if side:
+        clauses.append("side=?")
+        params.append(side)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def query(status=None, symbol=None, side=None, page=0, page_size=50):
+    """分頁查詢 (新到舊)，回傳 (DataFrame, 總筆數)"""
+    where, params = _where(status, symbol, side)
+    with _lock:
+        conn = connect()
+        try:
+            total = conn.execute(f"SELECT COUNT(*) FROM orders{where}", params).fetchone()[0]
+            df = pd.read_sql_query(
+                f"SELECT {', '.join(COLUMNS)} FROM orders{where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                conn, params=params + [page_size, page * page_size]
+            )
+        finally:
+            conn.close()
+    for col in ('created_at', 'filled_at', 'updated_at'):
+        df[col] = pd.to_datetime(df[col], unit='us', utc=True)
+    return df, total
+
+
+def summary(status=None, symbol=None, side=None):
+    """依代碼彙總：筆數、成交筆數、買 / 賣成交金額"""
+    where, params = _where(status, symbol, side)
+    with _lock:
+        conn = connect()
+        try:
+            return pd.read_sql_query(
+                f"""SELECT symbol,
+                           COUNT(*) AS orders,
+                           SUM(status='filled') AS filled,
+                           SUM(CASE WHEN side='buy' THEN COALESCE(filled_qty, 0) * COALESCE(filled_avg_price, 0) ELSE 0 END) AS buy_value,
+                           SUM(CASE WHEN side='sell' THEN COALESCE(filled_qty, 0) * COALESCE(filled_avg_price, 0) ELSE 0 END) AS sell_value
+                    FROM orders{where} GROUP BY symbol ORDER BY orders DESC""",
+                conn, params=params
+            )
+        finally:
+            conn.close()
+
+
+def mark(order_id, status):
+    """本機先更新單筆狀態 (例如剛送出取消 -> pending_cancel)，最終狀態交給下次同步"""
+    with _lock:
+        conn = connect()
+        try:
+            conn.execute("UPDATE orders SET status=?, is_open=? WHERE id=?", (status, int(status in OPEN_STATUSES), str(order_id)))
+            conn.commit()
+        finally:
+            conn.close()
@@ -0,0 +1,208 @@
+# order_tracker.py
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from api_client import client_order_id
+
+# 終結狀態：收到後就不再追蹤
+TERMINAL_EVENTS = {'fill', 'canceled', 'expired', 'rejected', 'done_for_day'}
+POLL_INTERVAL = 5      # 背景輪詢 (保險) 的間隔 (秒)
+STREAM_FRESH = 60      # 這麼多秒內收過串流事件，才算串流確實在運作
+HISTORY_SIZE = 200
+
+
+def order_dict(order):
+    """Alpaca Order 物件 / 串流 dict -> 一般 dict (至少含 id、symbol、status)"""
+    if isinstance(order, dict): return dict(order)
+    raw = getattr(order, '_raw', None)
+    if isinstance(raw, dict): return dict(raw)
+    return {k: getattr(order, k, None) for k in ('id', 'symbol', 'side', 'qty', 'status', 'filled_qty', 'filled_avg_price', 'limit_price')}
+
+
+class OrderTracker:
+    """
+    事件驅動的訂單追蹤：吃 trade_updates 事件 (new / partial_fill / fill / canceled ...)，
+    在訂單成交時執行登記好的後續動作 (例如掛出停利單)，UI 執行緒完全不用等待。
+    """
+
+    def __init__(self):
+        self.orders = {}                          # order_id -> 最新狀態 dict
+        self.history = deque(maxlen=HISTORY_SIZE)  # (時間, 事件, order dict)
+        self.actions = deque(maxlen=HISTORY_SIZE)  # 後續動作的執行結果
+        self._on_fill = {}                        # order_id -> [callback]
+        self.last_stream_event = 0.0              # 最近一次從串流 (而非輪詢) 收到事件的時間
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    @property
+    def streaming(self):
+        """串流是否確實有在送事件 (以實際收到的事件判斷，不看來源型別)"""
+        return time.monotonic() - self.last_stream_event < STREAM_FRESH
+
+    def subscribe(self, callback):
+        """callback(event, order)：每個事件都會呼叫"""
+        self._listeners.append(callback)
+
+    def on_fill(self, order_id, callback, label=None):
+        """
+        訂單完全成交 (或部分成交後被取消 / 到期) 時呼叫 callback(order)；如果已經成交過就立刻執行。
+        callback 的回傳值 (或例外) 會記錄在 actions。
+        """
+        order_id = str(order_id)
+        with self._lock:
+            known = self.orders.get(order_id)
+            if not (known and known.get('status') == 'filled'):
+                self._on_fill.setdefault(order_id, []).append((callback, label))
+                return
+        self._run(callback, label, known)
+
+    def watched(self):
+        with self._lock:
+            return list(self._on_fill)
+
+    def handle_update(self, event, order, from_stream=True):
+        """事件來源的入口 (任何執行緒都可以呼叫)；輪詢來的事件 from_stream=False"""
+        order = order_dict(order)
+        order_id = str(order.get('id'))
+        with self._lock:
+            if from_stream: self.last_stream_event = time.monotonic()
+            self.orders[order_id] = order
+            self.history.append((datetime.now(timezone.utc), event, order))
+            callbacks = self._on_fill.pop(order_id, []) if event in TERMINAL_EVENTS else []
+        for cb in self._listeners:
+            try: cb(event, order)
+            except Exception: pass
+        filled = float(order.get('filled_qty') or 0)
+        if event != 'fill' and filled <= 0:
+            for _, label in callbacks:
+                self._record(label, order, 'skipped', f"訂單 {event}，未執行後續動作")
+            return
+        # 部分成交後被取消 / 到期：依已成交的數量執行後續動作
+        for cb, label in callbacks:
+            self._run(cb, label, order)
+
+    def _run(self, callback, label, order):
+        try:
+            self._record(label, order, 'done', callback(order))
+        except Exception as e:
+            self._record(label, order, 'failed', str(e))
+
+    def _record(self, label, order, status, message):
+        self.actions.append({
+            'time': datetime.now(timezone.utc), 'label': label, 'order_id': order.get('id'),
+            'symbol': order.get('symbol'), 'status': status, 'message': message,
+        })
+
+
+def take_profit_action(api, symbol, qty, multiple=2.0, ordered_qty=None):
+    """
+    翻倍戰術的後續動作：依實際成交均價掛出 multiple 倍的 GTC 限價賣單。
+    只部分成交時，賣出張數依成交比例縮小 (至少 1 張)。client_order_id 由買單 id 決定，重複觸發也只會掛一次。
+    """
+    def action(order):
+        fill_price = float(order.get('filled_avg_price') or 0)
+        if fill_price <= 0: raise ValueError("沒有成交均價")
+        filled = int(float(order.get('filled_qty') or 0))
+        sell_qty = qty
+        if ordered_qty and 0 < filled < ordered_qty:
+            sell_qty = max(1, filled * qty // ordered_qty)
+        sell_price = round(fill_price * multiple, 2)
+        api.submit_order(symbol=symbol, qty=sell_qty, side='sell', type='limit', limit_price=sell_price, time_in_force='gtc',
+                         client_order_id=client_order_id('take-profit', order.get('id')))
+        return f"成交 {filled} 張，均價 ${fill_price} -> 已掛賣單 {sell_qty} 張 @ ${sell_price}"
+    return action
+
+
+# ========================================================
+# 事件來源：Alpaca trade_updates 串流 / 背景輪詢 / 本機替身 (離線測試用)
+# ========================================================
+class AlpacaTradeUpdates:
+    """訂閱 Alpaca 帳戶的 trade_updates 串流 (在背景執行緒跑 asyncio)"""
+
+    def __init__(self, key_id, secret_key, base_url):
+        from alpaca_trade_api.stream import Stream
+        self.stream = Stream(key_id, secret_key, base_url=base_url)
+        self._thread = None
+
+    def start(self, tracker):
+        async def handler(data):
+            tracker.handle_update(data.event, data.order)
+
+        self.stream.subscribe_trade_updates(handler)
+        self._thread = threading.Thread(target=self.stream.run, daemon=True)
+        self._thread.start()
+
+    def alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self):
+        self.stream.stop()
+
+
+class PollingUpdates:
+    """
+    保險用的背景輪詢：只查「有登記後續動作」的訂單。與串流同時運作，
+    串流金鑰錯誤或斷線 (在背景執行緒裡靜悄悄失敗) 時，後續動作仍會被觸發；同一張單的動作只會執行一次。
+    """
+
+    def __init__(self, api, interval=POLL_INTERVAL):
+        self.api = api
+        self.interval = interval
+        self._stop = threading.Event()
+        self._seen = {}
+
+    def start(self, tracker):
+        def run():
+            while not self._stop.wait(self.interval):
+                for order_id in tracker.watched():
+                    try: order = order_dict(self.api.get_order(order_id))
+                    except Exception: continue
+                    status = order.get('status')
+                    if self._seen.get(order_id) == status: continue
+                    self._seen[order_id] = status
+                    event = {'filled': 'fill', 'partially_filled': 'partial_fill'}.get(status, status)
+                    tracker.handle_update(event, order, from_stream=False)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+
+class LocalTradeUpdates:
+    """
+    本機替身：行為與 trade_updates 串流相同 (事件經佇列由背景執行緒送進 tracker)，
+    但事件由程式送出。simulate_fill 可模擬「N 秒後才成交」的情境。
+    trade_updates_mock.MockBroker 用它送出假券商的成交 / 取消事件 (python trade_updates_mock.py 跑情境檢查)。
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self, tracker):
+        def run():
+            while True:
+                item = self._queue.get()
+                if item is None: break
+                tracker.handle_update(*item)
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+
+    def emit(self, event, order):
+        self._queue.put((event, order_dict(order)))
+
+    def simulate_fill(self, order, price, delay=0.0):
+        order = order_dict(order)
+
+        def fill():
+            if delay: time.sleep(delay)
+            self.emit('fill', {**order, 'status': 'filled', 'filled_qty': order.get('qty'), 'filled_avg_price': str(price)})
+
+        threading.Thread(target=fill, daemon=True).start()
+
+    def stop(self):
+        self._queue.put(None)
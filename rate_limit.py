@@ -0,0 +1,55 @@
+# rate_limit.py
+import threading
+import time
+
+# Alpaca 交易 API 上限為每分鐘 200 次請求
+ALPACA_RATE_PER_SEC = 200 / 60
+ALPACA_BURST = 30
+
+
+class TokenBucket:
+    """
+    執行緒安全的 Token Bucket 限流器：平均每秒 rate 個 token，最多累積 capacity 個 (允許短暫爆量)。
+    取代程式裡寫死的 time.sleep()，讓並行請求剛好跑在上限附近。
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def try_acquire(self, tokens=1):
+        """有 token 就取走並回傳 True，否則立即回傳 False"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1, timeout=None):
+        """阻塞直到取得 token；超過 timeout 秒回傳 False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0: return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+# 全程序共用的 Alpaca 限流器 (Streamlit 每次 rerun 都沿用同一個)
+alpaca_limiter = TokenBucket(ALPACA_RATE_PER_SEC, ALPACA_BURST)
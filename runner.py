@@ -0,0 +1,158 @@
+# runner.py
+"""
+無頭 (Headless) 策略執行器：不開 Streamlit，也能定時跑 SMA 交叉自動交易。
+
+    python runner.py --once                  # 立即跑一次
+    python runner.py --every 15              # 開盤期間每 15 分鐘跑一次
+    python runner.py --at-open --delay 5     # 每天開盤後 5 分鐘跑一次
+    python runner.py --once --dry-run        # 只算信號不下單
+
+日誌為 JSON Lines (一行一筆事件)，每輪結束輸出一筆 metrics。
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import config
+import trading
+
+log = logging.getLogger('runner')
+
+
+class JsonFormatter(logging.Formatter):
+    """結構化日誌：每筆紀錄輸出成一行 JSON"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'event': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(log_file=None, level=logging.INFO):
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file: handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+    for h in handlers: h.setFormatter(JsonFormatter())
+    logging.basicConfig(level=level, handlers=handlers, force=True)
+
+
+def emit(event, level=logging.INFO, **fields):
+    log.log(level, event, extra={'fields': fields})
+
+
+def load_symbols(symbols=None):
+    if symbols: return symbols
+    if os.path.exists(config.WATCHLIST_FILE):
+        try:
+            with open(config.WATCHLIST_FILE, 'r') as f: return json.load(f)
+        except Exception: pass
+    return config.DEFAULT_WATCHLIST
+
+
+def run_once(api, symbols, days=500, dry_run=False, metrics_file=None):
+    """跑一輪策略：批次抓 K 線 -> get_signal -> 並行送單，回傳 metrics dict"""
+    t0 = time.time()
+    metrics = {'symbols': len(symbols), 'buy': 0, 'sell': 0, 'skip': 0, 'errors': 0, 'no_data': 0}
+
+    positions = {p.symbol: int(p.qty) for p in api.list_positions()}
+    t_data = time.time()
+    data = trading.get_market_data_many(api, symbols, days=days)
+    metrics['fetch_sec'] = round(time.time() - t_data, 3)
+    metrics['no_data'] = sum(1 for sym in symbols if data.get(sym) is None or data[sym].empty)
+
+    plans = trading.plan_strategy_orders({sym: data.get(sym) for sym in symbols if data.get(sym) is not None}, positions)
+    orders = [p for p in plans if p[1]]
+    metrics['skip'] = len(plans) - len(orders)
+    for sym, side, qty in plans:
+        emit('signal', symbol=sym, action=side or 'wait', qty=qty)
+
+    if dry_run:
+        for sym, side, qty in orders: emit('order_skipped_dry_run', symbol=sym, side=side, qty=qty)
+    else:
+        # 以本輪開始的時間 (分鐘) 當 run_id：同一輪被重跑時，送出的 client_order_id 相同，不會重複下單
+        run_id = datetime.fromtimestamp(t0, timezone.utc).strftime('runner-%Y%m%dT%H%M')
+        for r in trading.execute_orders_bulk(api, orders, run_id=run_id):
+            if r['status'] == 'submitted': metrics[r['side']] += 1
+            elif r['status'] == 'skipped': metrics['skip'] += 1  # 已有掛單
+            else: metrics['errors'] += 1
+            emit('order', logging.WARNING if r['status'] == 'failed' else logging.INFO, **r)
+
+    metrics['duration_sec'] = round(time.time() - t0, 3)
+    emit('run_complete', **metrics)
+    if hasattr(api, 'metrics'):
+        emit('api_metrics', endpoints=api.metrics())
+    if metrics_file:
+        with open(metrics_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'ts': datetime.now(timezone.utc).isoformat(), **metrics}) + '\n')
+    return metrics
+
+
+def _sleep_until(target, max_chunk=300):
+    """睡到 target (aware datetime)；分段睡，避免系統休眠後時間飄移"""
+    while True:
+        remaining = (target - datetime.now(timezone.utc)).total_seconds()
+        if remaining <= 0: return
+        time.sleep(min(remaining, max_chunk))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='SMA crossover auto-trader (headless)')
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--once', action='store_true', help='立即執行一次')
+    mode.add_argument('--every', type=float, metavar='MIN', help='開盤期間每 N 分鐘執行一次')
+    mode.add_argument('--at-open', action='store_true', help='每天開盤後執行一次')
+    parser.add_argument('--delay', type=float, default=5, help='--at-open：開盤後延遲幾分鐘 (預設 5)')
+    parser.add_argument('--symbols', nargs='+', help='標的清單 (預設讀 watchlist.json)')
+    parser.add_argument('--days', type=int, default=500, help='K 線回看天數')
+    parser.add_argument('--dry-run', action='store_true', help='只算信號，不下單')
+    parser.add_argument('--ignore-clock', action='store_true', help='--every：收盤時也執行')
+    parser.add_argument('--log-file', help='另存 JSON 日誌的檔案')
+    parser.add_argument('--metrics-file', help='每輪 metrics 追加寫入的 JSONL 檔')
+    args = parser.parse_args(argv)
+
+    setup_logging(args.log_file)
+    api = trading.get_api()
+    symbols = load_symbols(args.symbols)
+    emit('runner_start', symbols=symbols, mode='once' if args.once else ('every' if args.every else 'at_open'))
+
+    def safe_run():
+        try:
+            run_once(api, symbols, days=args.days, dry_run=args.dry_run, metrics_file=args.metrics_file)
+        except Exception as e:
+            emit('run_failed', logging.ERROR, error=str(e))
+
+    if args.once:
+        safe_run()
+        return
+
+    if args.at_open and api.get_clock().is_open:
+        safe_run()  # 啟動時已經開盤：先補跑今天這一輪
+
+    try:
+        while True:
+            clock = api.get_clock()
+            if args.every:
+                if clock.is_open or args.ignore_clock:
+                    safe_run()
+                    time.sleep(args.every * 60)
+                else:
+                    emit('market_closed', next_open=clock.next_open)
+                    _sleep_until(clock.next_open)
+            else:
+                target = clock.next_open + timedelta(minutes=args.delay)
+                emit('waiting_for_open', run_at=target)
+                _sleep_until(target)
+                safe_run()
+    except KeyboardInterrupt:
+        emit('runner_stop')
+
+
+if __name__ == '__main__':
+    main()
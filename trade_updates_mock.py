@@ -0,0 +1,129 @@
+# trade_updates_mock.py
+"""
+本機假券商 + trade_updates 替身 (離線測試訂單追蹤用，不需要 API Key、不會真的下單)。
+
+    python trade_updates_mock.py
+
+MockBroker 提供 submit_order / get_order / cancel_order (重複的 client_order_id 會像 Alpaca 一樣被拒絕)，
+成交 / 部分成交 / 取消事件經 order_tracker.LocalTradeUpdates 送進 OrderTracker，
+與正式串流走同一條路徑。直接執行時跑一輪翻倍戰術的情境檢查。
+"""
+import itertools
+import threading
+import time
+import order_tracker
+from api_client import client_order_id
+
+
+class DuplicateOrderError(Exception):
+    pass
+
+
+class MockBroker:
+    """記在記憶體裡的假券商：下單只記錄，成交與取消由程式觸發"""
+
+    def __init__(self, source=None):
+        self.source = source or order_tracker.LocalTradeUpdates()
+        self.orders = {}
+        self.submitted = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit_order(self, symbol, qty, side, type='market', time_in_force='day', limit_price=None, client_order_id=None, **kwargs):
+        with self._lock:
+            if client_order_id and any(o['client_order_id'] == client_order_id for o in self.orders.values()):
+                raise DuplicateOrderError(f"client_order_id must be unique: {client_order_id}")
+            order = {
+                'id': f"mock-{next(self._ids)}", 'client_order_id': client_order_id, 'symbol': symbol, 'side': side,
+                'qty': str(qty), 'type': type, 'time_in_force': time_in_force, 'limit_price': limit_price,
+                'status': 'new', 'filled_qty': '0', 'filled_avg_price': None,
+            }
+            self.orders[order['id']] = order
+            self.submitted.append(dict(order))
+        self.source.emit('new', order)
+        return dict(order)
+
+    def get_order(self, order_id):
+        with self._lock:
+            return dict(self.orders[order_id])
+
+    def cancel_order(self, order_id):
+        self._update(order_id, 'canceled', status='canceled')
+
+    def fill(self, order_id, qty, price):
+        """成交 qty 張 (累計)；全部成交送 fill，否則送 partial_fill"""
+        order = self.get_order(order_id)
+        filled = float(order['filled_qty']) + qty
+        done = filled >= float(order['qty'])
+        self._update(order_id, 'fill' if done else 'partial_fill', status='filled' if done else 'partially_filled',
+                     filled_qty=str(int(filled)), filled_avg_price=str(price))
+
+    def _update(self, order_id, event, **changes):
+        with self._lock:
+            self.orders[order_id].update(changes)
+            order = dict(self.orders[order_id])
+        self.source.emit(event, order)
+
+
+def wait_for(cond, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond(): return True
+        time.sleep(0.01)
+    return cond()
+
+
+def run_checks():
+    """翻倍戰術情境：全部成交、部分成交後取消、重複觸發；任何一項不符就丟 AssertionError"""
+    broker = MockBroker()
+    tracker = order_tracker.OrderTracker()
+    broker.source.start(tracker)
+
+    def buy(symbol, qty):
+        order = broker.submit_order(symbol=symbol, qty=qty, side='buy', type='limit', limit_price=1.0)
+        sell_qty = int(qty / 2)
+        tracker.on_fill(order['id'], order_tracker.take_profit_action(broker, symbol, sell_qty, multiple=2.0, ordered_qty=qty), label='翻倍')
+        return order
+
+    def sells(symbol):
+        return [o for o in broker.submitted if o['symbol'] == symbol and o['side'] == 'sell']
+
+    # 1. 分兩次全部成交：partial_fill 不觸發，fill 才掛賣單 (4 張的一半，2 倍均價)
+    a = buy('AAA', 4)
+    broker.fill(a['id'], 1, 1.00)
+    broker.fill(a['id'], 3, 1.20)
+    assert wait_for(lambda: sells('AAA')), "全部成交後沒有掛出停利單"
+    sell = sells('AAA')[0]
+    assert (sell['qty'], sell['limit_price'], sell['time_in_force']) == ('2', 2.4, 'gtc'), sell
+    assert sell['client_order_id'] == client_order_id('take-profit', a['id']), sell
+
+    # 2. 成交 2 / 6 張後取消：依成交比例賣 1 張
+    b = buy('BBB', 6)
+    broker.fill(b['id'], 2, 0.50)
+    broker.cancel_order(b['id'])
+    assert wait_for(lambda: sells('BBB')), "部分成交後取消，沒有依成交數量掛單"
+    assert sells('BBB')[0]['qty'] == '1', sells('BBB')
+
+    # 3. 完全沒成交就取消：跳過
+    c = buy('CCC', 2)
+    broker.cancel_order(c['id'])
+    assert wait_for(lambda: any(x['order_id'] == c['id'] for x in tracker.actions)), "取消事件沒有記錄"
+    assert not sells('CCC') and tracker.actions[-1]['status'] == 'skipped', list(tracker.actions)
+
+    # 4. 同一張買單的動作被觸發兩次 (例如串流與輪詢都送了 fill)：client_order_id 相同，第二張被拒絕
+    action = order_tracker.take_profit_action(broker, 'AAA', 2, ordered_qty=4)
+    try:
+        action(broker.get_order(a['id']))
+        raise AssertionError("重複觸發卻掛出第二張停利單")
+    except DuplicateOrderError:
+        pass
+    assert len(sells('AAA')) == 1
+
+    broker.source.stop()
+    return list(tracker.actions)
+
+
+if __name__ == '__main__':
+    for a in run_checks():
+        print(f"{a['symbol']:<4} {a['status']:<8} {a['message']}")
+    print("OK")
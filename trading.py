@@ -1,15 +1,29 @@
 # trading.py
 import alpaca_trade_api as tradeapi
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import streamlit as st # 記得匯入 streamlit
 from i18n import t
+import bar_store
+import news_store
+import asset_index
+import order_tracker
+import order_book
+import account_snapshot
+import order_store
+import rate_limit
+import api_client
+import indicators
+import indicator_cache
 
 # 移除 config 匯入，改用 st.secrets
 # import config 
 
-@st.cache_resource
-def get_api():
+def get_credentials():
+    """回傳 (key_id, secret_key, base_url)"""
     # 🔥 修改重點：改從 Streamlit 的 Secrets 讀取金鑰
     # 這樣上傳到 GitHub 才不會洩漏密碼，也才能在雲端執行
     try:
@@ -22,75 +36,210 @@ def get_api():
         key_id = config.ALPACA_API_KEY
         secret_key = config.ALPACA_SECRET_KEY
         base_url = config.BASE_URL
+    return key_id, secret_key, base_url
+
+@st.cache_resource
+def get_api():
+    # 包一層：共用限流 + 429/5xx 退避重試 + 每個端點的呼叫數與延遲統計
+    key_id, secret_key, base_url = get_credentials()
+    return api_client.InstrumentedREST(tradeapi.REST(key_id, secret_key, base_url), rate_limit.alpaca_limiter)
 
-    return tradeapi.REST(key_id, secret_key, base_url)
+@st.cache_resource
+def get_order_tracker():
+    """
+    全程式共用一個訂單追蹤器：訂閱 trade_updates 串流，同時一律跑背景輪詢當保險
+    (串流認證失敗或斷線不會拋例外，只靠串流的話後續動作會永遠不觸發)。
+    """
+    tracker = order_tracker.OrderTracker()
+    try: order_tracker.AlpacaTradeUpdates(*get_credentials()).start(tracker)
+    except Exception: pass
+    order_tracker.PollingUpdates(get_api()).start(tracker)
+    return tracker
+
+@st.cache_resource
+def get_order_book():
+    """本機鏡像的掛單 / 持倉簿 (跟著訂單追蹤器的事件更新)，Portfolio、Log 與下單流程共用"""
+    book = order_book.OrderBook(get_api())
+    book.attach(get_order_tracker())
+    return book
+
+@st.cache_resource
+def get_snapshot_service():
+    return account_snapshot.SnapshotService(get_api(), book=get_order_book())
 
-def execute_order(api, symbol, side, qty=1, price=None):
+def get_account_snapshot(force=False):
+    """帳戶 / 持倉 / 市場時鐘的共用快照 (5 秒內重繪都拿同一份，過期才並行重抓一輪)"""
+    return get_snapshot_service().get(force)
+
+def _submit_order(api, symbol, side, qty=1, price=None, client_order_id=None):
+    """送出單筆訂單 (不檢查掛單)，回傳 (order, 訊息)；client_order_id 讓重送的同一張單不會重複成交"""
+    extra = {'client_order_id': client_order_id} if client_order_id else {}
+    if price:
+        # 🔥 Limit Order (限價單) -> 支援夜間掛單
+        order = api.submit_order(
+            symbol=symbol,
+            qty=qty,
+            side=side,
+            type='limit',
+            limit_price=price,
+            time_in_force='day',
+            **extra
+        )
+        return order, f"✅ 已掛單 (Limit): {side.upper()} {qty}張 @ ${price:.2f}"
+    else:
+        # Market Order (市價單)
+        order = api.submit_order(
+            symbol=symbol,
+            qty=qty,
+            side=side,
+            type='market',
+            time_in_force='day',
+            **extra
+        )
+        return order, f"✅ 成功下單 (Market): {side.upper()} {qty} 單位"
+
+def execute_order(api, symbol, side, qty=1, price=None, book=None):
     try:
-        # 檢查是否已經有未成交的訂單
-        existing_orders = api.list_orders(status='open', symbols=[symbol])
+        # 檢查是否已經有未成交的訂單 (有掛單簿時直接讀記憶體)
+        existing_orders = book.open_orders(symbol) if book else api.list_orders(status='open', symbols=[symbol])
         if existing_orders:
             return f"⚠️ {symbol} 已有掛單，跳過。"
-            
-        if price:
-            # 🔥 Limit Order (限價單) -> 支援夜間掛單
-            api.submit_order(
-                symbol=symbol,
-                qty=qty,
-                side=side,
-                type='limit',
-                limit_price=price,
-                time_in_force='day'
-            )
-            return f"✅ 已掛單 (Limit): {side.upper()} {qty}張 @ ${price:.2f}"
-        else:
-            # Market Order (市價單)
-            api.submit_order(
-                symbol=symbol,
-                qty=qty,
-                side=side,
-                type='market',
-                time_in_force='day'
-            )
-            return f"✅ 成功下單 (Market): {side.upper()} {qty} 單位"
+        order, msg = _submit_order(api, symbol, side, qty, price)
+        if book: book.record(order)
+        return msg
 
     except Exception as e:
         return f"❌ 下單失敗 {symbol}: {e}"
 
-@st.cache_data(ttl=3600)
-def get_all_assets(_api):
+def build_open_order_index(open_orders):
+    """掛單索引：{symbol: {side: [order, ...]}}"""
+    index = {}
+    for o in open_orders:
+        index.setdefault(o.symbol, {}).setdefault(o.side, []).append(o)
+    return index
+
+def plan_strategy_orders(data, positions):
+    """
+    依 get_signal 為每檔標的決定動作 (純計算，不打 API)：
+    Buy 且未持有 -> 買 1 單位；Sell 且持有 -> 全數賣出。回傳 [(symbol, side, qty)]，side 為 None 代表觀望。
+    """
+    plans = []
+    for symbol, df in data.items():
+        signal, _ = get_signal(df, symbol)
+        if signal == "Buy" and symbol not in positions:
+            plans.append((symbol, 'buy', 1))
+        elif signal == "Sell" and symbol in positions:
+            plans.append((symbol, 'sell', positions[symbol]))
+        else:
+            plans.append((symbol, None, 0))
+    return plans
+
+def execute_orders_bulk(api, orders, max_workers=8, book=None, run_id=None):
+    """
+    批次下單：掛單只查一次 (整份快照建索引；有掛單簿 book 時直接讀記憶體)，不再每檔各打一次 list_orders；
+    需要送出的單再用有上限的 Thread Pool 並行送出，節流交給 get_api() 的共用限流器。
+    orders 為 [(symbol, side, qty)] 或 [(symbol, side, qty, limit_price)]；
+    依完成順序 yield 結果 dict：symbol / side / qty / status (submitted|skipped|failed) / order_id / message。
+    每張單的 client_order_id 由 (run_id, symbol, side, qty) 決定，同一批重送不會重複下單。
+    """
+    run_id = run_id or uuid.uuid4().hex
+    orders = [tuple(o) + (None,) * (4 - len(o)) for o in orders]
+    if not orders: return
+
+    def result(symbol, side, qty, status, message, order_id=None):
+        return {'symbol': symbol, 'side': side, 'qty': qty, 'status': status, 'order_id': order_id, 'message': message}
+
     try:
-        assets = _api.list_assets(status='active', asset_class='us_equity')
-        return [f"{asset.symbol} - {asset.name}" for asset in assets if asset.tradable]
-    except: return []
+        open_index = book.open_index() if book else build_open_order_index(order_book.list_all_open(api.list_orders))
+    except Exception as e:
+        for symbol, side, qty, _ in orders:
+            yield result(symbol, side, qty, 'failed', f"❌ 下單失敗 {symbol}: {e}")
+        return
+
+    to_submit = []
+    for symbol, side, qty, price in orders:
+        if symbol in open_index:
+            yield result(symbol, side, qty, 'skipped', f"⚠️ {symbol} 已有掛單，跳過。")
+        else:
+            to_submit.append((symbol, side, qty, price))
+
+    def submit(order):
+        symbol, side, qty, price = order
+        try:
+            coid = api_client.client_order_id(run_id, symbol, side, qty)
+            o, msg = _submit_order(api, symbol, side, qty, price, client_order_id=coid)
+            if book: book.record(o)
+            return result(symbol, side, qty, 'submitted', msg, getattr(o, 'id', None))
+        except Exception as e:
+            return result(symbol, side, qty, 'failed', f"❌ 下單失敗 {symbol}: {e}")
+
+    if not to_submit: return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(to_submit))) as pool:
+        for fut in as_completed([pool.submit(submit, o) for o in to_submit]):
+            yield fut.result()
 
-@st.cache_data(ttl=300)
-def get_stock_news(_api, symbol):
+def get_all_assets(api):
+    """所有可交易的美股 [(symbol, name)]"""
     try:
-        raw_news = _api.get_news(symbol=symbol, limit=8)
-        return [{'headline': n.headline, 'summary': n.summary, 'source': n.source, 'url': n.url, 'created_at': n.created_at} for n in raw_news]
+        assets = api.list_assets(status='active', asset_class='us_equity')
+        return [(asset.symbol, asset.name) for asset in assets if asset.tradable]
     except: return []
 
+@st.cache_resource(ttl=3600)
+def get_asset_index(_api):
+    """代碼 / 名稱搜尋索引 (伺服器端)；本機檔案快取每天只重建一次"""
+    return asset_index.load_index(lambda: get_all_assets(_api))
+
+def refresh_news(api, symbols):
+    """整份清單批次增量更新本機新聞庫 (多檔合併成一次 get_news，5 分鐘內不重抓)"""
+    fetch_many = lambda syms, start, limit, end: api.get_news(symbol=syms, start=start, end=end, limit=limit, exclude_contentless=False)
+    try: return news_store.sync(fetch_many, symbols)
+    except: return 0
+
+def get_stock_news(api, symbol, limit=8):
+    """從本機新聞庫讀最新新聞 (已去除近似重複的標題)"""
+    refresh_news(api, [symbol])
+    try: return news_store.get_news(symbol, limit=limit)
+    except: return []
+
+def add_indicators(bars, symbol=None):
+    """在日 K 上加上 SMA20/50/200 與 RSI (Wilder)，只保留最近 300 根；有 symbol 時走共用指標快取"""
+    if bars.empty: return pd.DataFrame()
+    for window in indicators.DEFAULT_SMA_WINDOWS:
+        bars[f'SMA{window}'] = indicator_cache.sma(symbol, bars, window)
+    bars['RSI'] = indicator_cache.rsi(symbol, bars)
+    if len(bars) > 300: bars = bars.tail(300)
+    return bars
+
 @st.cache_data(ttl=60) 
 def get_market_data(_api, symbol, days=700):
     try:
         start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
-        bars = _api.get_bars(symbol, tradeapi.rest.TimeFrame.Day, start=start_date, adjustment='raw').df
-        if bars.empty: return pd.DataFrame()
-        bars['SMA20'] = bars['close'].rolling(window=20).mean()
-        bars['SMA50'] = bars['close'].rolling(window=50).mean()
-        bars['SMA200'] = bars['close'].rolling(window=200).mean()
-        delta = bars['close'].diff()
-        gain = (delta.where(delta > 0, 0)).fillna(0)
-        loss = (-delta.where(delta < 0, 0)).fillna(0)
-        avg_gain = gain.ewm(alpha=1/14, min_periods=14, adjust=False).mean()
-        avg_loss = loss.ewm(alpha=1/14, min_periods=14, adjust=False).mean()
-        rs = avg_gain / avg_loss
-        bars['RSI'] = 100 - (100 / (1 + rs))
-        if len(bars) > 300: bars = bars.tail(300)
-        return bars
+        # 先讀本機 K 線資料庫，只向 Alpaca 補抓最後一根之後的新 K 線
+        fetch = lambda sym, start: _api.get_bars(sym, tradeapi.rest.TimeFrame.Day, start=start, adjustment='raw').df
+        bars = bar_store.get_bars(fetch, symbol, tradeapi.rest.TimeFrame.Day, start_date)
+        return add_indicators(bars, symbol)
     except: return pd.DataFrame()
 
+@st.cache_data(ttl=60)
+def get_market_data_batch(_api, symbols, days=700):
+    """
+    整份清單一次抓：Alpaca bars 端點接受多個 symbol，一個 (分頁) 請求取回全部，
+    再拆成各檔的 DataFrame 算指標。symbols 請傳 tuple (才能當快取 key)，回傳 {symbol: df}。
+    """
+    try:
+        start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        fetch_many = lambda syms, start: _api.get_bars(list(syms), tradeapi.rest.TimeFrame.Day, start=start, adjustment='raw').df
+        raw = bar_store.get_bars_many(fetch_many, list(symbols), tradeapi.rest.TimeFrame.Day, start_date)
+        return {sym: add_indicators(bars, sym) for sym, bars in raw.items()}
+    except: return {sym: pd.DataFrame() for sym in symbols}
+
+def get_market_data_many(api, symbols, days=700):
+    """多檔標的 K 線 (走批次請求)，回傳 {symbol: df}"""
+    symbols = tuple(dict.fromkeys(symbols))
+    if not symbols: return {}
+    return get_market_data_batch(api, symbols, days=days)
+
 def get_signal(df, symbol=None):
     if df.empty: return t('error_data'), "warning"
     cash_etfs = ['SGOV', 'SHV', 'BIL', 'USFR']
@@ -101,36 +250,57 @@ def get_signal(df, symbol=None):
     elif last['SMA20'] < last['SMA200']: return "Sell", "error"
     else: return "Wait", "warning"
 
-def get_orders_history(api, status='all', limit=50):
-    """獲取歷史訂單紀錄"""
+def sync_order_history(api, force=False):
+    """更新本機訂單歷史 (第一次會往回翻完整歷史，之後只抓新單；30 秒內不重複)"""
+    try: return order_store.sync(api.list_orders, api.get_order, force=force)
+    except: return 0
+
+def get_orders_history(api, status='all', symbol=None, page=0, page_size=50):
+    """從本機訂單歷史分頁讀取，回傳 (DataFrame, 總筆數)"""
+    sync_order_history(api)
     try:
-        # 獲取最近的訂單
-        orders = api.list_orders(status=status, limit=limit, nested=True)
-        data = []
-        for o in orders:
-            # 轉換時間格式
-            created_at = o.created_at.strftime('%Y-%m-%d %H:%M') if hasattr(o, 'created_at') else ''
-            filled_at = o.filled_at.strftime('%Y-%m-%d %H:%M') if o.filled_at else '-'
-            
-            data.append({
-                "時間 (提交)": created_at,
-                "時間 (成交)": filled_at,
-                "代碼": o.symbol,
-                "方向": "🟢 買入" if o.side == 'buy' else "🔴 賣出",
-                "數量": int(o.qty) if o.qty else 0,
-                "成交均價": float(o.filled_avg_price) if o.filled_avg_price else 0.0,
-                "狀態": o.status,
-                "類型": o.type,
-                "ID": o.id
-            })
-        return pd.DataFrame(data)
-    except Exception as e:
-        return pd.DataFrame()
+        df, total = order_store.query(status, symbol=symbol, page=page, page_size=page_size)
+    except Exception:
+        return pd.DataFrame(), 0
+    data = pd.DataFrame({
+        "時間 (提交)": df['created_at'].dt.strftime('%Y-%m-%d %H:%M').fillna(''),
+        "時間 (成交)": df['filled_at'].dt.strftime('%Y-%m-%d %H:%M').fillna('-'),
+        "代碼": df['symbol'],
+        "方向": np.where(df['side'] == 'buy', "🟢 買入", "🔴 賣出"),
+        "數量": df['qty'].fillna(0).astype(int),
+        "成交均價": df['filled_avg_price'].fillna(0.0),
+        "狀態": df['status'],
+        "類型": df['type'],
+        "ID": df['id'],
+    })
+    return data, total
 
 def cancel_order(api, order_id):
-    """取消特定訂單"""
+    """取消特定訂單 (送出取消要求；真正的 canceled / filled 由下次同步寫入)"""
     try:
         api.cancel_order(order_id)
+        order_store.mark(order_id, 'pending_cancel')
         return True
     except:
-        return False
\ No newline at end of file
+        return False
+
+def cancel_orders_bulk(api, order_ids, max_workers=8):
+    """
+    批次取消：用有上限的 Thread Pool 並行送出 cancel_order (節流交給 get_api() 的共用限流器)，
+    依完成順序 yield 結果 dict：order_id / status (requested|failed) / message。
+    requested 只代表取消要求已送出 (本機記為 pending_cancel)，訂單仍可能先成交；最終狀態由下次同步寫入。
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    if not order_ids: return
+
+    def cancel(order_id):
+        try:
+            api.cancel_order(order_id)
+            order_store.mark(order_id, 'pending_cancel')
+            return {'order_id': order_id, 'status': 'requested', 'message': "⏳ 已送出取消要求"}
+        except Exception as e:
+            return {'order_id': order_id, 'status': 'failed', 'message': f"❌ 取消失敗: {e}"}
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(order_ids))) as pool:
+        for fut in as_completed([pool.submit(cancel, i) for i in order_ids]):
+            yield fut.result()